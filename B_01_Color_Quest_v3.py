@@ -1,7 +1,44 @@
 from tkinter import *
 from functools import partial  # To prevent unwanted windows
-import csv
 import random
+import threading
+import time
+from C_06_score_index import ScoreIndex
+from C_07_color_space_index import ColorSpaceIndex
+from C_09_color_resolver import ColorResolver
+from C_10_palette_packs import DEFAULT_PACK, PaletteCache, find_palette_packs, load_palette_file
+from C_11_catalog_watcher import CatalogWatcher
+from C_14_alias_sampler import WeightedColorDealer
+from C_15_round_analyzer import analyze_catalog
+from C_16_bot_strategies import BOT_STRATEGIES
+from C_17_round_history import RoundHistory
+from C_18_history_table import HistoryTable
+from C_19_score_chart import REDRAW_MS, ScoreChart
+from C_20_history_store import HistoryStore, best_colors
+from C_22_log_segments import GameLogManager
+from C_24_leaderboard import CATEGORIES, WINDOWS, Leaderboard, entry_text
+
+# Options for a game (anything not chosen on the start screen uses these)
+DEFAULT_GAME_OPTIONS = {
+    "player": "Player",
+    "difficulty": "Normal",
+    "pack": DEFAULT_PACK,
+    "favour_unseen": False,
+    "bot": None,
+    "tick_ms": 800,
+    "turbo": False,
+    "round_seconds": 0,
+    "speed_run": False
+}
+
+# One frame at 60 Hz (key presses should be on screen within this)
+FRAME_MS = 1000 / 60
+
+# Demo mode settings
+DEMO_ROUNDS = 10
+GAME_OVER_PAUSE_MS = 3000
+DIALOG_WAIT_MS = 250
+TURBO_RATE_WINDOW = 100
 
 
 # Helper functions go here
@@ -16,44 +53,56 @@ def round_ans(val):
     return int(raw_rounded)
 
 
-def get_colors():
+def load_colors(color_file):
     """
-    Retrieves colors from csv file
+    Retrieves colors from the compiled catalog (or the csv
+    file if the catalog is out of date / hasn't been compiled)
+    :param color_file: Name of the csv file
     :return: List of colors which where each list item has the
-    color name, associated score and foreground color for the text
+    color name, associated score, foreground color for the text
+    and the color's hex code (resolved by Tk once and cached)
     """
+    return color_resolver.resolve_catalog(load_palette_file(color_file))
 
-    # Retrieve colors from csv file and put them in a list
-    file = open("00_colour_list_hex_v3.csv", 'r')
-    all_colors = list(csv.reader(file, delimiter=","))
-    file.close()
 
-    # Remove the first row
-    all_colors.pop(0)
-
-    return all_colors
+def get_colors(pack=DEFAULT_PACK):
+    """
+    Retrieves colors for a palette pack (loaded the first time it's used)
+    :param pack: Name of the palette pack
+    :return: List of colors (name | score | foreground | hex code)
+    """
+    return palette_cache.get(pack)
 
 
-def get_round_colors():
+def get_round_colors(deal_colors=None, pack=DEFAULT_PACK):
     """
     Choose four colors from larger list ensuring that the scores are all different.
+    :param deal_colors: Optional function that deals the four colors (used by the
+    difficulty modes, eg: a ScoreIndex or ColorSpaceIndex deal)
+    :param pack: Name of the palette pack to choose from
     :return: List of colors and score to beat (Median of scores)
     """
 
-    all_color_list = get_colors()
+    if deal_colors is not None:
+        # Difficulty mode - the index has already made sure scores are different
+        round_colors = deal_colors()
+        color_scores = [item[1] for item in round_colors]
 
-    # Set up lists
-    round_colors = []
-    color_scores = []
+    else:
+        all_color_list = get_colors(pack)
 
-    # Loop until we have four colors with different scores...
-    while len(round_colors) < 4:
-        potential_color = random.choice(all_color_list)
+        # Set up lists
+        round_colors = []
+        color_scores = []
 
-        # Get the score and check it's not a duplicate
-        if potential_color[1] not in color_scores:
-            round_colors.append(potential_color)
-            color_scores.append(potential_color[1])
+        # Loop until we have four colors with different scores...
+        while len(round_colors) < 4:
+            potential_color = random.choice(all_color_list)
+
+            # Get the score and check it's not a duplicate
+            if potential_color[1] not in color_scores:
+                round_colors.append(potential_color)
+                color_scores.append(potential_color[1])
 
     # Find target score (median)
 
@@ -68,6 +117,73 @@ def get_round_colors():
     return round_colors, median, highest
 
 
+def prepare_round(deal_colors=None, pack=DEFAULT_PACK):
+    """
+    Deals a round and works out how each color button should look
+    :param deal_colors: Optional function that deals the four colors (see get_round_colors)
+    :param pack: Name of the palette pack to choose from
+    :return: round colors, target score, highest score and a list of
+    button settings (fg | bg | text) for the four color buttons
+    """
+
+    round_colors, median, highest = get_round_colors(deal_colors, pack)
+
+    button_configs = []
+    for item in round_colors:
+        # Hex code for the background so Tk doesn't have to look the name up again
+        button_configs.append({"fg": item[2], "bg": item[3], "text": item[0]})
+
+    return round_colors, median, highest, button_configs
+
+
+class RoundPrefetcher:
+    """
+    Deals the next round on a worker thread while the
+    player is still reading the results of the current round
+    """
+
+    def __init__(self, deal_function=prepare_round):
+        """
+        :param deal_function: Function that returns a prepared round
+        """
+        self.deal_function = deal_function
+        self.worker = None
+        self.next_round = None
+
+    def start(self):
+        """
+        Starts dealing the next round in the background
+        """
+        self.next_round = None
+        self.worker = threading.Thread(target=self.deal, daemon=True)
+        self.worker.start()
+
+    def deal(self):
+        """
+        Runs on the worker thread (no widgets are touched here)
+        """
+        self.next_round = self.deal_function()
+
+    def take(self):
+        """
+        Hands over the prefetched round. If the worker is still busy we wait
+        for it, and if it never ran (or failed) the round is dealt right now.
+        :return: Prepared round (see prepare_round)
+        """
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
+
+        prepared = self.next_round
+        self.next_round = None
+
+        # Fallback - prefetch wasn't started or didn't finish properly
+        if prepared is None:
+            prepared = self.deal_function()
+
+        return prepared
+
+
 class StartGame:
     """
     Initial Game interface (asks users how many
@@ -128,6 +244,183 @@ class StartGame:
                                   command=self.check_rounds)
         self.play_button.grid(row=0, column=1)
 
+        # Difficulty choice (normal rounds are completely random)
+        self.difficulty = StringVar()
+        self.difficulty.set("Normal")
+
+        self.difficulty_frame = Frame(self.start_frame)
+        self.difficulty_frame.grid(row=4)
+
+        # Lookalike rounds use colors that are close together (but still score differently)
+        for count, item in enumerate(["Easy", "Normal", "Hard", "Lookalike"]):
+            make_radio = Radiobutton(self.difficulty_frame, text=item,
+                                     value=item, variable=self.difficulty,
+                                     font="Arial 12")
+            make_radio.grid(row=0, column=count, padx=5)
+
+        # Palette pack choice (packs are only loaded once they are played)
+        self.palette_pack = StringVar()
+        self.palette_pack.set(DEFAULT_PACK)
+
+        self.palette_frame = Frame(self.start_frame)
+        self.palette_frame.grid(row=5, pady=5)
+
+        self.palette_label = Label(self.palette_frame, text="Palette:", font="Arial 12")
+        self.palette_label.grid(row=0, column=0)
+
+        self.palette_menu = OptionMenu(self.palette_frame, self.palette_pack,
+                                       *palette_cache.palette_packs.keys())
+        self.palette_menu.config(font="Arial 12", width=15)
+        self.palette_menu.grid(row=0, column=1, padx=5)
+
+        # Option to show colors the player hasn't seen much more often (normal rounds)
+        self.favour_unseen = BooleanVar()
+        self.favour_unseen_check = Checkbutton(self.start_frame, font="Arial 12",
+                                               text="Show rarely seen colors more often",
+                                               variable=self.favour_unseen)
+        self.favour_unseen_check.grid(row=6)
+
+        # Timed rounds (zero means no time limit)
+        self.timer_frame = Frame(self.start_frame)
+        self.timer_frame.grid(row=8)
+
+        self.timer_label = Label(self.timer_frame, font="Arial 12",
+                                 text="Seconds per round (0 = no limit):")
+        self.timer_label.grid(row=0, column=0)
+
+        self.round_seconds_spinbox = Spinbox(self.timer_frame, from_=0, to=60,
+                                             width=4, font="Arial 12")
+        self.round_seconds_spinbox.grid(row=0, column=1, padx=5)
+
+        # Speed run - total game time is recorded (keys 1 - 4 choose, Enter / Space for next)
+        self.speed_run = BooleanVar()
+        self.speed_run_check = Checkbutton(self.start_frame, font="Arial 12",
+                                           text="Speed run (keys 1-4 choose, Enter / Space for next)",
+                                           variable=self.speed_run)
+        self.speed_run_check.grid(row=9)
+
+        # Player name (games are saved under this name for the lifetime stats)
+        self.player_frame = Frame(self.start_frame)
+        self.player_frame.grid(row=10, pady=5)
+
+        self.player_label = Label(self.player_frame, text="Player:", font="Arial 12")
+        self.player_label.grid(row=0, column=0)
+
+        self.player_entry = Entry(self.player_frame, font="Arial 12", width=20)
+        self.player_entry.insert(0, DEFAULT_GAME_OPTIONS["player"])
+        self.player_entry.grid(row=0, column=1, padx=5)
+
+        # Best games (today, this week and all time)
+        self.leaderboard_button = Button(self.start_frame, font="Arial 12 bold",
+                                         fg="#FFFFFF", bg="#6C8EBF",
+                                         text="Leaderboard", width=12,
+                                         command=self.to_leaderboard)
+        self.leaderboard_button.grid(row=11, pady=5)
+
+        # Demo (attract) mode - choose a bot, its speed, and whether to run flat out
+        self.bot_strategy = StringVar()
+        self.bot_strategy.set(list(BOT_STRATEGIES)[0])
+        self.turbo = BooleanVar()
+
+        self.demo_frame = Frame(self.start_frame)
+        self.demo_frame.grid(row=7, pady=5)
+
+        self.bot_menu = OptionMenu(self.demo_frame, self.bot_strategy, *BOT_STRATEGIES.keys())
+        self.bot_menu.config(font="Arial 12", width=8)
+        self.bot_menu.grid(row=0, column=0, padx=5)
+
+        self.tick_spinbox = Spinbox(self.demo_frame, from_=100, to=3000, increment=100,
+                                    width=5, font="Arial 12")
+        self.tick_spinbox.delete(0, END)
+        self.tick_spinbox.insert(0, DEFAULT_GAME_OPTIONS["tick_ms"])
+        self.tick_spinbox.grid(row=0, column=1)
+
+        self.tick_label = Label(self.demo_frame, text="ms", font="Arial 12")
+        self.tick_label.grid(row=0, column=2)
+
+        self.turbo_check = Checkbutton(self.demo_frame, text="Turbo", font="Arial 12",
+                                       variable=self.turbo)
+        self.turbo_check.grid(row=0, column=3, padx=5)
+
+        self.demo_button = Button(self.demo_frame, font="Arial 12 bold",
+                                  fg="#FFFFFF", bg="#333333",
+                                  text="Demo", width=8,
+                                  command=self.start_demo)
+        self.demo_button.grid(row=0, column=4, padx=5)
+
+    def game_options(self):
+        """
+        :return: Dictionary of the options chosen on the start screen
+        """
+        try:
+            round_seconds = max(float(self.round_seconds_spinbox.get()), 0)
+        except ValueError:
+            round_seconds = 0
+
+        return {
+            "player": self.player_entry.get().strip() or DEFAULT_GAME_OPTIONS["player"],
+            "difficulty": self.difficulty.get(),
+            "pack": self.palette_pack.get(),
+            "favour_unseen": self.favour_unseen.get(),
+            "round_seconds": round_seconds,
+            "speed_run": self.speed_run.get()
+        }
+
+    def to_leaderboard(self):
+        DisplayLeaderboard(self)
+
+    def start_demo(self):
+        """
+        Starts a game played by a bot (uses the number of rounds
+        in the entry box if there is a valid one)
+        """
+        try:
+            rounds_wanted = int(self.num_rounds_entry.get())
+        except ValueError:
+            rounds_wanted = DEMO_ROUNDS
+        if rounds_wanted < 1:
+            rounds_wanted = DEMO_ROUNDS
+
+        try:
+            tick_ms = max(int(self.tick_spinbox.get()), 0)
+        except ValueError:
+            tick_ms = DEFAULT_GAME_OPTIONS["tick_ms"]
+
+        demo_options = self.game_options()
+        demo_options["bot"] = self.bot_strategy.get()
+        demo_options["player"] = f"{demo_options['bot']} Bot"
+        demo_options["tick_ms"] = tick_ms
+        demo_options["turbo"] = self.turbo.get()
+
+        # Reset label (for when users come back to home screen)
+        self.choose_label.config(text="How many rounds do you want to play?",
+                                 fg="#009900", font="Arial 12 bold")
+
+        if self.check_pack(demo_options["pack"]):
+            Play(rounds_wanted, demo_options)
+            root.withdraw()
+
+    def check_pack(self, pack):
+        """
+        Loads the chosen palette pack and checks it can deal a round
+        (shows what is wrong with the pack if it can't be used)
+        :param pack: Name of the palette pack
+        :return: True if the pack can be played
+        """
+        # Swap in any palettes that were edited since the last game
+        catalog_watcher.apply_pending(color_resolver.resolve_catalog)
+
+        try:
+            all_colors = get_colors(pack)
+            if len(set(item[1] for item in all_colors)) < 4:
+                raise ValueError("At least four different scores are needed to deal a round")
+        except (OSError, ValueError) as error:
+            self.choose_label.config(text=f"Oops - The {pack} pack can't be used.\n{error}",
+                                     fg="#990000", font="Arial 10 bold")
+            return False
+
+        return True
+
     def check_rounds(self):
         """
         Checks users have 1 or more rounds
@@ -146,20 +439,22 @@ class StartGame:
         # Checks that number of rounds is more than zero
         try:
             rounds_wanted = int(rounds_wanted)
-            if rounds_wanted > 0:
-                # Invoke Play Class (and take across number of rounds)
-                Play(rounds_wanted)
-                # Hide root window (ie: hide rounds choice window).
-                root.withdraw()
-                # Clear out the input box and reset label
-                self.num_rounds_entry.delete(0, END)
-                self.choose_label.config(text="How many rounds do you want to play?")
-
-            else:
+            if rounds_wanted <= 0:
                 has_errors = "yes"
         except ValueError:
             has_errors = "yes"
 
+        # Pack is loaded (and checked) before the game starts
+        game_options = self.game_options()
+        if has_errors == "no" and self.check_pack(game_options["pack"]):
+            # Invoke Play Class (and take across number of rounds and game options)
+            Play(rounds_wanted, game_options)
+            # Hide root window (ie: hide rounds choice window).
+            root.withdraw()
+            # Clear out the input box and reset label
+            self.num_rounds_entry.delete(0, END)
+            self.choose_label.config(text="How many rounds do you want to play?")
+
         # Display the error if necessary
         if has_errors == "yes":
             self.choose_label.config(text=error, fg="#990000",
@@ -173,7 +468,15 @@ class Play:
     Interface for playing the color quest game
     """
 
-    def __init__(self, how_many):
+    def __init__(self, how_many, game_options=None):
+
+        # Fill in any options that weren't chosen
+        self.game_options = dict(DEFAULT_GAME_OPTIONS)
+        if game_options is not None:
+            self.game_options.update(game_options)
+
+        difficulty = self.game_options["difficulty"]
+        pack = self.game_options["pack"]
 
         # Integers / String Variables
         self.target_score = IntVar()
@@ -187,10 +490,63 @@ class Play:
 
         self.rounds_won = IntVar()
 
-        # Color lists and score list
+        # Colors for this round and the best score available
         self.round_color_list = []
-        self.all_scores_list = []
-        self.all_high_score_list = []
+        self.round_highest = 0
+
+        # Round by round history (compact, with running totals for the stats)
+        self.history = RoundHistory()
+
+        # Reaction times are measured from the deal (in nanoseconds)
+        self.deal_time_ns = 0
+
+        # Countdown for timed rounds
+        self.round_seconds = self.game_options["round_seconds"]
+        self.round_deadline = 0
+        self.countdown_id = None
+
+        # Speed run timing (nanoseconds)
+        self.game_start_ns = 0
+        self.game_time_ns = 0
+
+        # Swap in any palettes that were edited since the last game
+        catalog_watcher.apply_pending(color_resolver.resolve_catalog)
+
+        # Weighted dealer (only used when favouring rarely seen colors)
+        self.color_dealer = None
+        self.times_seen = {}
+
+        # Easy / Hard rounds are dealt from a sorted score index (built once per
+        # game) and Lookalike rounds from a spatial index of the colors (built
+        # once per pack from the hex codes and kept with the loaded pack)
+        if difficulty == "Normal" and self.game_options["favour_unseen"]:
+            self.color_dealer = WeightedColorDealer(get_colors(pack))
+            deal_function = partial(prepare_round, self.color_dealer.deal)
+        elif difficulty == "Normal":
+            deal_function = partial(prepare_round, None, pack)
+        elif difficulty == "Lookalike":
+            color_space_index = palette_cache.get_built(pack, ColorSpaceIndex)
+            deal_function = partial(prepare_round, color_space_index.deal)
+        else:
+            score_index = ScoreIndex(get_colors(pack))
+            deal_function = partial(prepare_round,
+                                    partial(score_index.deal,
+                                            score_index.spread_for(difficulty)))
+
+        # Next round is dealt in the background while results are shown
+        self.prefetcher = RoundPrefetcher(deal_function)
+
+        # Every round is also saved to the player's lifetime history
+        # (only once the pack has loaded and the dealer is ready)
+        self.game_id = history_store.start_game(self.game_options["player"], pack,
+                                                difficulty, how_many)
+        self.log_game = game_log.start_game(self.game_options["player"])
+
+        # Per color hint table (win chance / expected points) is loaded from the
+        # cached analysis, or worked out, in the background - never on the GUI thread
+        self.hint_table = None
+        threading.Thread(target=self.load_hint_table, daemon=True,
+                         args=[palette_cache.palette_packs[pack]]).start()
 
         self.play_box = Toplevel()
 
@@ -201,6 +557,12 @@ class Play:
         self.play_box.protocol('WM_DELETE_WINDOW', root.destroy)
         self.play_box.protocol('WM_DELETE_WINDOW', root.destroy)
 
+        # Keyboard controls - 1 to 4 choose a color, Enter / Space go to the next round
+        for item in range(0, 4):
+            self.play_box.bind(str(item + 1), partial(self.key_choose, item))
+        for item in ["<Return>", "<space>"]:
+            self.play_box.bind(item, self.key_next)
+
         # Body font for most labels
         body_font = "Arial 12"
 
@@ -276,10 +638,27 @@ class Play:
         # Stats button disabled if user hasn't played a round
         self.stats_button.config(state=DISABLED)
 
+        # Countdown label (timed rounds only)
+        self.timer_label = Label(self.game_frame, font="Arial 14 bold", fg="#990000")
+        if self.round_seconds > 0:
+            self.timer_label.grid(row=8, pady=5)
+
         # Once interface has been created, invoke new
         # round function for first round.
         self.new_round()
 
+        # Hints / stats dialogues open for this game (they use its buttons,
+        # so demo mode waits for them to close before starting another game)
+        self.open_dialogs = []
+
+        # Demo mode - a bot plays the game
+        self.autoplay = None
+        if self.game_options["bot"] is not None:
+            bot = BOT_STRATEGIES[self.game_options["bot"]]()
+            self.autoplay = Autoplay(self, bot, self.game_options["tick_ms"],
+                                     self.game_options["turbo"])
+            self.autoplay.start()
+
     def new_round(self):
         """
         Chooses four colors, works out median for score to beat.
@@ -292,13 +671,13 @@ class Play:
 
         rounds_wanted = self.rounds_wanted.get()
 
-        # Get round colors and median score...
-        self.round_color_list, median, highest = get_round_colors()
+        # Get round colors and median score (usually dealt already by the prefetcher)...
+        self.round_color_list, median, highest, button_configs = self.prefetcher.take()
 
         # Set target score as median (for later comparison)
         self.target_score.set(median)
 
-        self.all_high_score_list.append(highest)
+        self.round_highest = highest
 
         # Update heading and score to beat labels. "hide" results label
         self.heading_label.config(text=f"Round {rounds_played + 1} of {rounds_wanted}")
@@ -308,24 +687,90 @@ class Play:
         # Configure buttons using foreground and background colors from list
         # enable color buttons (disabled at the end of the last round)
         for count, item in enumerate(self.color_button_ref):
-            item.config(fg=self.round_color_list[count][2],
-                        bg=self.round_color_list[count][0],
-                        text=self.round_color_list[count][0],
-                        state=NORMAL)
+            item.config(state=NORMAL, **button_configs[count])
 
         self.next_button.config(state=DISABLED)
 
+        # Reaction time is measured from here (and a speed run's time from the first deal)
+        self.deal_time_ns = time.perf_counter_ns()
+        if rounds_played == 0:
+            self.game_start_ns = self.deal_time_ns
+
+        if self.round_seconds > 0:
+            self.round_deadline = time.perf_counter() + self.round_seconds
+            self.countdown_tick()
+
+    def countdown_tick(self):
+        """
+        Updates the countdown and ends the round when time runs out. The time
+        left is always worked out from perf_counter, and the next tick is aimed
+        at the next tenth of a second, so late after() calls never add up.
+        """
+        remaining = self.round_deadline - time.perf_counter()
+
+        if remaining <= 0:
+            self.countdown_id = None
+            self.timer_label.config(text="Time left: 0.0 s")
+            self.round_results(None)
+            return
+
+        self.timer_label.config(text=f"Time left: {remaining:.1f} s")
+        delay_ms = int(remaining % 0.1 * 1000) + 1
+        self.countdown_id = self.play_box.after(delay_ms, self.countdown_tick)
+
+    def key_choose(self, user_choice, event):
+        """
+        Chooses a color from the keyboard (if the color buttons are enabled)
+        """
+        if str(self.color_button_ref[user_choice].cget("state")) != NORMAL:
+            return
+
+        key_time = time.perf_counter_ns()
+        self.round_results(user_choice)
+        self.trace_latency(key_time)
+
+    def key_next(self, event):
+        """
+        Goes to the next round from the keyboard (if the next button is enabled)
+        """
+        if str(self.next_button.cget("state")) != NORMAL:
+            return
+
+        key_time = time.perf_counter_ns()
+        self.new_round()
+        self.trace_latency(key_time)
+
+    def trace_latency(self, key_time):
+        """
+        Records how long it took from the key press until the window had been updated
+        :param key_time: perf_counter_ns when the key press was handled
+        """
+        self.play_box.update_idletasks()
+        self.history.input_latencies.add(time.perf_counter_ns() - key_time)
+
+    def stop_countdown(self):
+        if self.countdown_id is not None:
+            self.play_box.after_cancel(self.countdown_id)
+            self.countdown_id = None
+
     def round_results(self, user_choice):
         """
-        Retrieves which button was pushed (index 0 - 3), retrieves
-        score and then compares it with median, updates results and
-        adds results to stats list.
+        Retrieves which button was pushed (index 0 - 3, or None if time
+        ran out), retrieves score and then compares it with median,
+        updates results and adds results to stats list.
         """
+        self.stop_countdown()
+
         # Enable stats button after one round has been played
         self.stats_button.config(state=NORMAL)
 
-        # Get user score and color based on button press...
-        score = int(self.round_color_list[user_choice][1])
+        # Get user score and color based on button press (no score if time ran out)...
+        if user_choice is None:
+            score = 0
+            reaction_ns = None
+        else:
+            score = int(self.round_color_list[user_choice][1])
+            reaction_ns = time.perf_counter_ns() - self.deal_time_ns
 
         # Add one to the number of rounds played and
         # retrieve the number of rounds won
@@ -334,24 +779,45 @@ class Play:
         self.rounds_played.set(rounds_played)
         rounds_won = self.rounds_won.get()
 
-        # Alternate way to get button name. Good for if buttons have been scrambled
-        color_name = self.color_button_ref[user_choice].cget('text')
-
         # Retrieve target score and compare with user score to find round result
         target = self.target_score.get()
 
-        if score >= target:
+        if user_choice is None:
+            result_text = "Out of time! You lost this round."
+            result_bg = '#F8CECC'
+            points = 0
+            won = False
+
+        elif score >= target:
+            # Alternate way to get button name. Good for if buttons have been scrambled
+            color_name = self.color_button_ref[user_choice].cget('text')
+
             result_text = f"Success! {color_name} earned you {score} points."
             result_bg = "#82B366"
-            self.all_scores_list.append(score)
+            points = score
+            won = True
 
             rounds_won += 1
             self.rounds_won.set(rounds_won)
 
         else:
+            color_name = self.color_button_ref[user_choice].cget('text')
             result_text = f"Oops {color_name} ({score}) is less than the target."
             result_bg = '#F8CECC'
-            self.all_scores_list.append(0)
+            points = 0
+            won = False
+
+        self.history.record(self.round_color_list, user_choice, target, points,
+                            self.round_highest, won, reaction_ns)
+        history_store.record_round(self.game_id, rounds_played,
+                                   [item[0] for item in self.round_color_list],
+                                   None if user_choice is None else self.round_color_list[user_choice][0],
+                                   target, points, self.round_highest, won,
+                                   None if reaction_ns is None else reaction_ns / 1e6)
+        game_log.log_round(self.log_game, rounds_played,
+                           [item[0] for item in self.round_color_list], user_choice, won,
+                           target, points, self.round_highest,
+                           None if reaction_ns is None else reaction_ns // 1000000)
 
         self.results_label.config(text=result_text, bg=result_bg)
 
@@ -363,11 +829,24 @@ class Play:
         rounds_wanted = self.rounds_wanted.get()
 
         if rounds_played == rounds_wanted:
+            self.game_time_ns = time.perf_counter_ns() - self.game_start_ns
+            game_log.flush()
+
             # Work out success rate
             success_rate = rounds_won / rounds_played * 100
             success_string = f"Success Rate: " \
                              f"{rounds_won} / {rounds_played} " \
                              f"({success_rate:.0f}%)"
+            if self.game_options["speed_run"]:
+                success_string += f"\nTime: {self.game_time_ns / 1e9:.2f} s"
+
+            # Bot games don't go on the leaderboard
+            if self.game_options["bot"] is None:
+                placed = leaderboard.add_game(self.game_options["player"], self.history.total_points,
+                                              rounds_won, rounds_played, self.game_time_ns / 1e9,
+                                              self.game_options["speed_run"])
+                if placed:
+                    success_string += "\nYou made the leaderboard!"
 
             # Configure 'end game' labels / buttons
             self.heading_label.config(text="Game Over")
@@ -377,31 +856,189 @@ class Play:
             self.next_button.config(state=DISABLED, text="Game Over")
             self.end_game_button.config(text="Play Again", bg="#006600")
 
+        else:
+            # Swap in edited palettes between rounds (never mid-round), then
+            # deal the next round while the player reads the result
+            catalog_watcher.apply_pending(color_resolver.resolve_catalog)
+            self.update_color_weights()
+            self.prefetcher.start()
+
         for item in self.color_button_ref:
             item.config(state=DISABLED)
 
+    def update_color_weights(self):
+        """
+        Makes the colors from this round less likely to be dealt again
+        (weight is 1 / (1 + number of times seen))
+        """
+        if self.color_dealer is None:
+            return
+
+        new_weights = {}
+        for item in self.round_color_list:
+            self.times_seen[item[0]] = self.times_seen.get(item[0], 0) + 1
+            new_weights[item[0]] = 1 / (1 + self.times_seen[item[0]])
+
+        self.color_dealer.set_weights(new_weights)
+
+    def restart_game(self):
+        """
+        Closes this game and starts another one with the same
+        settings (used when demo mode finishes a game)
+        """
+        self.close_play()
+        Play(self.rounds_wanted.get(), self.game_options)
+        root.withdraw()
+
     def close_play(self):
         # Reshow root (ie: choose rounds) and end
         # current game / allow new game to start
+        if self.autoplay is not None:
+            self.autoplay.stop()
+        self.stop_countdown()
+        self.history.close()
+        game_log.finish_game(self.log_game)
+
         root.deiconify()
         self.play_box.destroy()
 
+    def load_hint_table(self, color_file):
+        """
+        Loads the hint table for the palette (runs on a worker thread)
+        :param color_file: Name of the palette's csv file
+        """
+        try:
+            self.hint_table = analyze_catalog(color_file)["colors"]
+        except (OSError, ValueError):
+            # No round hints for this palette
+            self.hint_table = {}
+
+    def round_hints(self):
+        """
+        Looks up each color button in the hint table
+        :return: Hint text for the current round
+        """
+        if self.hint_table is None:
+            return "Hints for this round are still being worked out..."
+
+        hint_lines = []
+        for item in self.round_color_list:
+            color_stats = self.hint_table.get(item[0])
+            if color_stats is None:
+                hint_lines.append(f"{item[0]}: no hint available")
+            else:
+                hint_lines.append(f"{item[0]}: {color_stats[1] * 100:.0f}% chance to win, "
+                                  f"{color_stats[2]:.0f} points expected")
+
+        return "\n".join(hint_lines)
+
     def to_hints(self):
         """
         Displays hints for playing game
         """
         rounds_played = self.rounds_played.get()
-        DisplayHints(self, rounds_played)
+        DisplayHints(self, rounds_played, self.round_hints())
 
     def to_stats(self):
         """
         Retrieves everything we need to display the game / round statistics
         """
-        # IMPORTANT: retrieve number of rounds won as a
-        # number (rather than the 'self' container)
-        rounds_won = self.rounds_won.get()
-        stats_bundle = [rounds_won, self.all_scores_list, self.all_high_score_list]
-        Stats(self, stats_bundle)
+        # The history keeps running totals, so this is
+        # just as quick after a million rounds as after one
+        Stats(self, self.history)
+
+
+class Autoplay:
+    """
+    Demo mode - a bot plays the game. Every move is scheduled with
+    after() so the mainloop is never blocked.
+    """
+
+    def __init__(self, partner, strategy, tick_ms, turbo=False):
+        """
+        :param partner: Play instance to drive
+        :param strategy: BotStrategy that chooses the buttons
+        :param tick_ms: Delay between moves
+        :param turbo: Run as fast as possible and measure rounds per second
+        """
+        self.partner = partner
+        self.strategy = strategy
+        self.tick_ms = 0 if turbo else tick_ms
+        self.turbo = turbo
+        self.after_id = None
+
+        # Turbo measurements (blocks are never longer than a game, and the
+        # best rate is carried over to the next game in the game options)
+        self.window_size = min(TURBO_RATE_WINDOW, partner.rounds_wanted.get())
+        self.window_rounds = 0
+        self.window_start = None
+        self.best_rate = partner.game_options.get("turbo_best_rate", 0)
+
+    def start(self):
+        self.window_start = time.perf_counter()
+        self.schedule(self.tick, self.tick_ms)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.partner.play_box.after_cancel(self.after_id)
+            self.after_id = None
+
+    def schedule(self, function, delay):
+        self.after_id = self.partner.play_box.after(delay, function)
+
+    def tick(self):
+        """
+        Makes one move - chooses a color, goes to the next round
+        or (once the game is over) starts a new game
+        """
+        partner = self.partner
+
+        if str(partner.color_button_ref[0].cget("state")) == NORMAL:
+            choice = self.strategy.choose(partner.round_color_list, partner.hint_table)
+            partner.round_results(choice)
+
+            if self.turbo:
+                self.measure()
+
+        elif str(partner.next_button.cget("state")) == NORMAL:
+            partner.new_round()
+
+        else:
+            # Game over - leave the results up for a moment (unless in turbo)
+            self.schedule(self.restart, 0 if self.turbo else GAME_OVER_PAUSE_MS)
+            return
+
+        self.schedule(self.tick, self.tick_ms)
+
+    def restart(self):
+        """
+        Starts the next game, once any hints / stats dialogue is closed
+        (restarting destroys the window they belong to)
+        """
+        if self.partner.open_dialogs:
+            self.schedule(self.restart, DIALOG_WAIT_MS)
+            return
+
+        self.partner.restart_game()
+
+    def measure(self):
+        """
+        Works out rounds per second (including redrawing the window) over
+        each block of rounds and shows it in the title bar
+        """
+        self.partner.play_box.update_idletasks()
+        self.window_rounds += 1
+
+        if self.window_rounds == self.window_size:
+            now = time.perf_counter()
+            rate = self.window_rounds / (now - self.window_start)
+            self.best_rate = max(self.best_rate, rate)
+            self.partner.game_options["turbo_best_rate"] = self.best_rate
+            self.partner.play_box.title(f"Turbo: {rate:.0f} rounds / second "
+                                        f"(best {self.best_rate:.0f})")
+
+            self.window_rounds = 0
+            self.window_start = now
 
 
 class DisplayHints:
@@ -409,12 +1046,13 @@ class DisplayHints:
     Displays hints for color quest game
     """
 
-    def __init__(self, partner, rounds_played):
+    def __init__(self, partner, rounds_played, round_hint_text):
         self.rounds_played = rounds_played
 
         # setup dialogue box and background color
         background = "#ffe6cc"
         self.hint_box = Toplevel()
+        partner.open_dialogs.append(self)
 
         # disable help, stats AND end game buttons to prevent users
         # from leaving a dialogue open and then going back to the rounds dialogue
@@ -455,6 +1093,18 @@ class DisplayHints:
                                      justify="left")
         self.hint_text_label.grid(row=1, padx=10)
 
+        # Hints for the colors in the current round
+        self.round_hint_heading = Label(self.hint_frame,
+                                        text="This Round",
+                                        font="Arial 12 bold")
+        self.round_hint_heading.grid(row=2)
+
+        self.round_hint_label = Label(self.hint_frame,
+                                      text=round_hint_text,
+                                      wraplength=350,
+                                      justify="left")
+        self.round_hint_label.grid(row=3, padx=10)
+
         # Set up dismiss button
         self.dismiss_button = Button(self.hint_frame,
                                      font="Arial 12 bold",
@@ -462,12 +1112,13 @@ class DisplayHints:
                                      bg="#cc6600",
                                      fg="#FFFFFF",
                                      command=partial(self.close_hints, partner))
-        self.dismiss_button.grid(row=2, padx=10, pady=10)
+        self.dismiss_button.grid(row=4, padx=10, pady=10)
 
         # List and loop to set background color on
         # everything except the buttons
         recolor_list = [self.hint_frame, self.hint_heading_label,
-                        self.hint_text_label]
+                        self.hint_text_label, self.round_hint_heading,
+                        self.round_hint_label]
 
         for item in recolor_list:
             item.config(bg=background)
@@ -485,6 +1136,7 @@ class DisplayHints:
         if self.rounds_played >= 1:
             partner.stats_button.config(state=NORMAL)
 
+        partner.open_dialogs.remove(self)
         self.hint_box.destroy()
 
 
@@ -493,23 +1145,20 @@ class Stats:
     Displays stats for color quest game
     """
 
-    def __init__(self, partner, all_stats_info):
+    def __init__(self, partner, history):
 
         # Disable buttons to prevent program crashing
         partner.hints_button.config(state=DISABLED)
         partner.end_game_button.config(state=DISABLED)
         partner.stats_button.config(stat=DISABLED)
 
-        # Extract information from master list...
-        rounds_won = all_stats_info[0]
-        user_scores = all_stats_info[1]
-        high_scores = all_stats_info[2]
-
-        # Sort user scores to find high score...
-        user_scores.sort()
+        # Extract running totals from the history...
+        rounds_won = history.rounds_won
+        rounds_played = history.rounds
 
         # setup dialogue box and background color
         self.stat_box = Toplevel()
+        partner.open_dialogs.append(self)
 
         # Disable help button
         partner.stats_button.config(state=DISABLED)
@@ -524,13 +1173,11 @@ class Stats:
         self.stat_frame.grid()
 
         # Math to populate stats dialogue
-        rounds_played = len(user_scores)
-
         success_rate = rounds_won / rounds_played * 100
-        total_score = sum(user_scores)
-        max_possible = sum(high_scores)
+        total_score = history.total_points
+        max_possible = history.max_possible
 
-        best_score = user_scores[-1]
+        best_score = history.best_points
         average_score = total_score / rounds_played
 
         # Strings for stats labels
@@ -555,7 +1202,46 @@ class Stats:
             comment_string = ""
             comment_color = "#F0F0F0"
 
-        average_score_string = f"Average Score: {average_score:.0f}\n"
+        average_score_string = f"Average Score: {average_score:.0f}"
+
+        # Reaction times (rounds where time ran out don't count)
+        if history.reaction_times.count:
+            mean_ms, median_ms, p95_ms, worst_ms = history.reaction_times.summary()
+            reaction_string = f"Reaction Time: mean {mean_ms:.0f} ms, " \
+                              f"median {median_ms:.0f} ms,\n95% within {p95_ms:.0f} ms\n"
+        else:
+            reaction_string = "Reaction Time: N/A\n"
+
+        # Key press to screen update times (should be within one frame)
+        if history.input_latencies.count:
+            mean_ms, median_ms, p95_ms, worst_ms = history.input_latencies.summary()
+            reaction_string += f"Key to Screen: 95% within {p95_ms:.1f} ms, " \
+                               f"worst {worst_ms:.1f} ms"
+            if worst_ms > FRAME_MS:
+                reaction_string += " (slower than a frame)"
+            reaction_string += "\n"
+
+        # Lifetime numbers for this player (rounds still waiting to be
+        # written in the background show up next time)
+        player = partner.game_options["player"]
+        games, lifetime_rounds, lifetime_won, lifetime_points, best_game, best_round = \
+            history_store.lifetime_stats(player)
+
+        lifetime_string = f"{player}: {games} games, {lifetime_won} / {lifetime_rounds} rounds won"
+        if lifetime_rounds:
+            lifetime_string += f" ({lifetime_won / lifetime_rounds * 100:.0f}%)"
+        lifetime_string += f"\nAll-time Best: {best_round} points (best game {best_game})"
+
+        top_colors = best_colors(history_store.color_win_rates(player))
+        if top_colors:
+            lifetime_string += "\nBest Colors: " + \
+                               ", ".join(f"{item[0]} ({item[2] / item[1] * 100:.0f}%)"
+                                         for item in top_colors)
+
+        # Rounds the history store couldn't write (it keeps trying)
+        if history_store.error:
+            lifetime_string += f"\nNot saved yet: {history_store.unsaved_rounds} rounds " \
+                               f"({history_store.error})"
 
         heading_font = "Arial 16 bold"
         normal_font = "Arial 14"
@@ -570,7 +1256,10 @@ class Stats:
             [comment_string, comment_font, "W"],
             ["\nRound Stats", heading_font, ""],
             [best_score_string, normal_font, "W"],
-            [average_score_string, normal_font, "W"]
+            [average_score_string, normal_font, "W"],
+            [reaction_string, normal_font, "W"],
+            ["Lifetime", heading_font, ""],
+            [lifetime_string, normal_font, "W"]
         ]
 
         stats_label_ref_list = []
@@ -585,6 +1274,20 @@ class Stats:
         stats_comment_label = stats_label_ref_list[4]
         stats_comment_label.config(bg=comment_color)
 
+        # Chart of the game so far (drawn per pixel, not per round)
+        self.score_chart = ScoreChart(self.stat_frame, history)
+        self.score_chart.grid(row=11, padx=10, pady=5)
+
+        # Round by round history (only the rows on screen are drawn)
+        self.history = history
+        self.history_table = HistoryTable(self.stat_frame, history)
+        self.history_table.grid(row=12, padx=10, pady=5)
+
+        # Rounds can still be played while the stats are open (the table
+        # catches up with them together, not once per round)
+        self.refresh_id = None
+        history.add_listener(self.round_added)
+
         # Set up dismiss button
         self.dismiss_button = Button(self.stat_frame,
                                      font=("Arial", "16", "bold"),
@@ -592,22 +1295,139 @@ class Stats:
                                      fg="#FFFFFF", width=20,
                                      command=partial(self.close_stats,
                                                      partner))
-        self.dismiss_button.grid(row=8, padx=10, pady=10)
+        self.dismiss_button.grid(row=13, padx=10, pady=10)
+
+    def round_added(self, round_number):
+        if self.refresh_id is None:
+            self.refresh_id = self.stat_box.after(REDRAW_MS, self.refresh_table)
+
+    def refresh_table(self):
+        self.refresh_id = None
+        self.history_table.refresh()
 
     def close_stats(self, partner):
         """
        Closes help dialogue box (and enables help button)
         """
+        self.history.remove_listener(self.round_added)
+        if self.refresh_id is not None:
+            self.stat_box.after_cancel(self.refresh_id)
+        self.score_chart.close()
+
         # Put help button back to normal...
         partner.hints_button.config(state=NORMAL)
         partner.end_game_button.config(state=NORMAL)
         partner.stats_button.config(state=NORMAL)
+        partner.open_dialogs.remove(self)
         self.stat_box.destroy()
 
 
+class DisplayLeaderboard:
+    """
+    Displays the best games in each category and time window
+    """
+
+    def __init__(self, partner):
+
+        # setup dialogue box and background color
+        background = "#DAE8FC"
+        self.leaderboard_box = Toplevel()
+
+        # Disable leaderboard button
+        partner.leaderboard_button.config(state=DISABLED)
+
+        # If users press cross at top, closes leaderboard
+        # and enables leaderboard button
+        self.leaderboard_box.protocol('WM_DELETE_WINDOW',
+                                      partial(self.close_leaderboard, partner))
+
+        # Set up the frame
+        self.leaderboard_frame = Frame(self.leaderboard_box, width=350, bg=background)
+        self.leaderboard_frame.grid()
+
+        self.heading_label = Label(self.leaderboard_frame, text="Leaderboard",
+                                   font="Arial 16 bold", bg=background)
+        self.heading_label.grid(row=0, pady=5)
+
+        # Category and time window choices (one row of radio buttons each)
+        self.category = StringVar()
+        self.category.set(CATEGORIES[0])
+        self.window = StringVar()
+        self.window.set(WINDOWS[-1])
+
+        for row, choices in enumerate([[CATEGORIES, self.category], [WINDOWS, self.window]]):
+            choice_frame = Frame(self.leaderboard_frame, bg=background)
+            choice_frame.grid(row=row + 1)
+
+            for count, item in enumerate(choices[0]):
+                make_radio = Radiobutton(choice_frame, text=item, value=item,
+                                         variable=choices[1], font="Arial 12",
+                                         bg=background, command=self.show_board)
+                make_radio.grid(row=0, column=count, padx=5)
+
+        self.board_label = Label(self.leaderboard_frame, font="Arial 12",
+                                 justify="left", anchor="w", width=45,
+                                 bg="#FFFFFF", padx=10, pady=10)
+        self.board_label.grid(row=3, padx=10, pady=10)
+
+        # Set up dismiss button
+        self.dismiss_button = Button(self.leaderboard_frame,
+                                     font="Arial 12 bold",
+                                     text="Dismiss", bg="#333333",
+                                     fg="#FFFFFF", width=12,
+                                     command=partial(self.close_leaderboard,
+                                                     partner))
+        self.dismiss_button.grid(row=4, padx=10, pady=10)
+
+        self.show_board()
+
+    def show_board(self):
+        """
+        Shows the games on the chosen board
+        """
+        category = self.category.get()
+        games = leaderboard.top(category, self.window.get())
+
+        if games:
+            board_text = "\n".join(f"{count + 1}. {entry_text(category, item)}"
+                                   for count, item in enumerate(games))
+        elif category == "Speed":
+            board_text = "No speed runs yet."
+        else:
+            board_text = "No games yet."
+
+        self.board_label.config(text=board_text)
+
+    def close_leaderboard(self, partner):
+        """
+        Closes leaderboard dialogue box (and enables leaderboard button)
+        """
+        partner.leaderboard_button.config(state=NORMAL)
+        self.leaderboard_box.destroy()
+
+
 # Main routine
 if __name__ == "__main__":
     root = Tk()
     root.title("Color Quest")
+    color_resolver = ColorResolver(root)
+    palette_cache = PaletteCache(find_palette_packs(), load_colors)
+
+    # Palettes edited while the game is running are reloaded in the background
+    catalog_watcher = CatalogWatcher(palette_cache)
+    catalog_watcher.start()
+
+    # Lifetime history of every game (written in the background)
+    history_store = HistoryStore()
+
+    # Binary log of every round (rotated, compacted and snapshotted as it grows)
+    game_log = GameLogManager()
+
+    # Best games in each category (updated when a game finishes)
+    leaderboard = Leaderboard()
     StartGame()
     root.mainloop()
+
+    # Make sure the last rounds are saved before quitting
+    history_store.close()
+    game_log.close()
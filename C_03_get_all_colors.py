@@ -1,13 +1,268 @@
+from tkinter import *
 import csv
-import random
+import hashlib
+import json
+import os
+import re
+import sys
 
-# Retrieve colors from csv file and put them in a list
+from C_09_color_resolver import ColorResolver
 
-file = open("00_colour_list_hex_v3.csv", 'r')
-all_colors = list(csv.reader(file, delimiter=","))
-file.close()
+COLOR_FILE = "00_colour_list_hex_v3.csv"
+CATALOG_FILE = "00_colour_catalog.json"
 
-# Remove the first row
-all_colors.pop(0)
+# Scores (and the targets worked out from them) are kept in 16 bit columns
+# by the round history, so they have to fit in 0 - 65535
+MAX_SCORE = 65535
 
-print(all_colors)
+
+def read_colors(color_file=COLOR_FILE):
+    """
+    Retrieves colors from csv file
+    :param color_file: Name of the csv file
+    :return: List of colors (name | score | foreground)
+    """
+
+    # Retrieve colors from csv file and put them in a list
+    file = open(color_file, 'r')
+    all_colors = parse_colors(file)
+    file.close()
+
+    return all_colors
+
+
+def parse_colors(lines):
+    """
+    Turns csv lines into a list of colors
+    :param lines: File (or list of lines) including the heading row
+    :return: List of colors (name | score | foreground)
+    """
+    all_colors = list(csv.reader(lines, delimiter=","))
+
+    # Remove the first row
+    if all_colors:
+        all_colors.pop(0)
+
+    return all_colors
+
+
+def catalog_file_for(color_file):
+    """
+    Works out where the compiled catalog for a csv file lives (the classic
+    colors use CATALOG_FILE, palette packs get one next to their csv file)
+    :param color_file: Name of the csv file
+    :return: Name of the compiled catalog
+    """
+    if color_file == COLOR_FILE:
+        return CATALOG_FILE
+
+    return os.path.splitext(color_file)[0] + "_catalog.json"
+
+
+def file_hash(file_name):
+    """
+    :param file_name: File to hash
+    :return: SHA-256 of the file contents (as hex)
+    """
+    file = open(file_name, 'rb')
+    contents = file.read()
+    file.close()
+
+    return hashlib.sha256(contents).hexdigest()
+
+
+def validate_colors(all_colors, rgb_function=None):
+    """
+    Checks every row of the catalog
+    :param all_colors: List of colors (name | score | foreground)
+    :param rgb_function: Optional function that raises an error if Tk can't
+    resolve a color name (eg: a widget's winfo_rgb)
+    :return: List of errors and list of warnings (both lists of strings)
+    """
+    errors = []
+    warnings = []
+
+    names_seen = {}
+    scores_seen = {}
+
+    for count, item in enumerate(all_colors):
+        # Row 1 is the heading, so colors start at row 2
+        row_number = count + 2
+
+        if len(item) < 3:
+            errors.append(f"Row {row_number}: expected name, score and foreground")
+            continue
+
+        name, score, foreground = item[0], item[1], item[2]
+
+        if not score.strip().isdigit():
+            errors.append(f"Row {row_number}: score '{score}' is not a whole number")
+        elif int(score) > MAX_SCORE:
+            errors.append(f"Row {row_number}: score {score} is more than {MAX_SCORE}")
+
+        if not re.fullmatch(r"#[0-9A-Fa-f]{6}", foreground):
+            errors.append(f"Row {row_number}: foreground '{foreground}' is not a #RRGGBB code")
+
+        if rgb_function is not None:
+            try:
+                rgb_function(name)
+            except TclError:
+                errors.append(f"Row {row_number}: Tk doesn't recognise the color '{name}'")
+
+        names_seen.setdefault(name.lower(), []).append(row_number)
+        scores_seen.setdefault(score, []).append(row_number)
+
+    for name, rows in names_seen.items():
+        if len(rows) > 1:
+            errors.append(f"Duplicate name '{name}' on rows {rows}")
+
+    for score, rows in scores_seen.items():
+        if len(rows) > 1:
+            warnings.append(f"Score {score} is shared by {len(rows)} colors")
+
+    return errors, warnings
+
+
+def compile_catalog(color_file=COLOR_FILE, catalog_file=CATALOG_FILE,
+                    rgb_function=None, force=False):
+    """
+    Validates the csv file and writes the compiled catalog, but only
+    if the csv has changed since the catalog was last compiled
+    :param color_file: Name of the csv file
+    :param catalog_file: Name of the compiled catalog
+    :param rgb_function: Optional Tk name check (see validate_colors)
+    :param force: Compile even if the csv hasn't changed
+    :return: errors, warnings and whether the catalog was written
+    """
+    source_hash = file_hash(color_file)
+    old_catalog = read_catalog_file(catalog_file)
+
+    if not force and old_catalog is not None and old_catalog["source_hash"] == source_hash:
+        # Nothing changed - just refresh the file details so loading trusts it again
+        stat = os.stat(color_file)
+        if [old_catalog["source_size"], old_catalog["source_mtime"]] != [stat.st_size, stat.st_mtime_ns]:
+            old_catalog["source_size"] = stat.st_size
+            old_catalog["source_mtime"] = stat.st_mtime_ns
+            write_catalog_file(catalog_file, old_catalog)
+        return [], [], False
+
+    all_colors = read_colors(color_file)
+    errors, warnings = validate_colors(all_colors, rgb_function)
+
+    # Never write a catalog with errors in it
+    if errors:
+        return errors, warnings, False
+
+    stat = os.stat(color_file)
+    catalog = {
+        "source": color_file,
+        "source_hash": source_hash,
+        "source_size": stat.st_size,
+        "source_mtime": stat.st_mtime_ns,
+        "colors": [item[:3] for item in all_colors]
+    }
+    write_catalog_file(catalog_file, catalog)
+
+    return errors, warnings, True
+
+
+def read_catalog_file(catalog_file):
+    """
+    :param catalog_file: Name of the compiled catalog
+    :return: Catalog dictionary (or None if it doesn't exist / can't be read)
+    """
+    try:
+        file = open(catalog_file, 'r')
+        catalog = json.load(file)
+        file.close()
+    except (OSError, ValueError):
+        return None
+
+    return catalog
+
+
+def write_catalog_file(catalog_file, catalog):
+    """
+    Writes the catalog to a temporary file first so that
+    a half written catalog is never left behind
+    """
+    temporary_file = catalog_file + ".tmp"
+    file = open(temporary_file, 'w')
+    json.dump(catalog, file)
+    file.close()
+
+    os.replace(temporary_file, catalog_file)
+
+
+def load_catalog(color_file=COLOR_FILE, catalog_file=CATALOG_FILE):
+    """
+    Loads the compiled catalog if it was built from the current csv file
+    (same size and modification time), otherwise reads the csv as usual
+    :param color_file: Name of the csv file
+    :param catalog_file: Name of the compiled catalog
+    :return: List of colors (name | score | foreground)
+    """
+    catalog = read_catalog_file(catalog_file)
+
+    if catalog is not None and catalog.get("source") == color_file:
+        stat = os.stat(color_file)
+        if catalog["source_size"] == stat.st_size and \
+                catalog["source_mtime"] == stat.st_mtime_ns:
+            return catalog["colors"]
+
+    # Compiled catalogs were checked when they were compiled, but the csv
+    # hasn't been, so make sure its scores at least fit the round history
+    all_colors = read_colors(color_file)
+    for item in all_colors:
+        if not item[1].strip().isdigit() or int(item[1]) > MAX_SCORE:
+            raise ValueError(f"Score '{item[1]}' for {item[0]} is not a whole number from 0 to {MAX_SCORE}")
+
+    return all_colors
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Usage: C_03_get_all_colors.py [csv file] [--force] [--list]
+    file_names = [item for item in sys.argv[1:] if not item.startswith("--")]
+    csv_file = file_names[0] if file_names else COLOR_FILE
+
+    # Tk is needed to check color names (skip the check if there is no display)
+    try:
+        root = Tk()
+        root.withdraw()
+        name_check = root.winfo_rgb
+    except TclError:
+        root = None
+        name_check = None
+        print("Warning: Tk is not available, color names have not been checked")
+
+    compiled_file = catalog_file_for(csv_file)
+    found_errors, found_warnings, written = compile_catalog(csv_file, compiled_file,
+                                                           rgb_function=name_check,
+                                                           force="--force" in sys.argv)
+
+    for problem in found_warnings:
+        print("Warning:", problem)
+    for problem in found_errors:
+        print("Error:", problem)
+
+    print(f"Hash: {file_hash(csv_file)}")
+    if found_errors:
+        print(f"{len(found_errors)} error(s) - catalog not written")
+    elif written:
+        print(f"Catalog written to {compiled_file}")
+    else:
+        print("Catalog is up to date")
+
+    # Resolve every color name to a hex code now so the game doesn't have to
+    if root is not None and not found_errors:
+        ColorResolver(root).resolve(item[0] for item in load_catalog(csv_file))
+
+    if "--list" in sys.argv:
+        print(load_catalog(csv_file, compiled_file))
+
+    if root is not None:
+        root.destroy()
+
+    sys.exit(1 if found_errors else 0)
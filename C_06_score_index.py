@@ -0,0 +1,128 @@
+import bisect
+import random
+import sys
+
+from C_03_get_all_colors import load_catalog
+
+# Gap between the lowest and highest score in a round, as a fraction of
+# the catalog's score range (None means deal completely at random)
+DIFFICULTY_SPREADS = {
+    "Easy": 0.9,
+    "Normal": None,
+    "Hard": 0.15
+}
+
+
+class ScoreIndex:
+    """
+    Colors sorted by score so that rounds with a chosen score spread
+    can be dealt using binary searches rather than retry loops
+    """
+
+    def __init__(self, all_colors):
+        """
+        :param all_colors: List of colors (name | score | foreground)
+        """
+
+        # Sort colors by score and keep the scores alongside for bisect
+        self.colors = sorted(all_colors, key=lambda item: int(item[1]))
+        self.scores = [int(item[1]) for item in self.colors]
+
+        # Each score only appears once in this list
+        self.distinct_scores = sorted(set(self.scores))
+
+        if len(self.distinct_scores) < 4:
+            raise ValueError("At least four different scores are needed to deal a round")
+
+    def spread_for(self, difficulty):
+        """
+        Converts a difficulty level into a score spread for this catalog
+        :param difficulty: Key from DIFFICULTY_SPREADS
+        :return: Wanted gap between lowest and highest score (or None)
+        """
+        fraction = DIFFICULTY_SPREADS[difficulty]
+        if fraction is None:
+            return None
+
+        score_range = self.distinct_scores[-1] - self.distinct_scores[0]
+        return round(score_range * fraction)
+
+    def color_with_score(self, score):
+        """
+        Picks a random color with the given score
+        :param score: Score which must exist in the catalog
+        :return: Color (name | score | foreground)
+        """
+        start = bisect.bisect_left(self.scores, score)
+        end = bisect.bisect_right(self.scores, score)
+        return self.colors[random.randrange(start, end)]
+
+    def deal(self, spread):
+        """
+        Chooses four colors with different scores where the gap between the
+        lowest and highest score is as close as possible to spread.
+        :param spread: Wanted gap between the lowest and highest score
+        :return: List of four colors in random order
+        """
+        distinct = self.distinct_scores
+        last_position = len(distinct) - 1
+
+        # Lowest score has to leave room for the spread (and three more scores)
+        last_low = bisect.bisect_right(distinct, distinct[-1] - spread) - 1
+        last_low = min(max(last_low, 0), last_position - 3)
+        low_position = random.randint(0, last_low)
+
+        # Highest score is whichever score is closest to lowest + spread
+        wanted = distinct[low_position] + spread
+        high_position = bisect.bisect_left(distinct, wanted, lo=low_position)
+        if high_position > last_position or \
+                (high_position > low_position and
+                 wanted - distinct[high_position - 1] < distinct[high_position] - wanted):
+            high_position -= 1
+
+        # Make sure there are two scores in between
+        high_position = min(max(high_position, low_position + 3), last_position)
+
+        # Middle scores are anywhere between the lowest and highest
+        middle_positions = random.sample(range(low_position + 1, high_position), 2)
+        positions = [low_position] + middle_positions + [high_position]
+
+        round_colors = [self.color_with_score(distinct[item]) for item in positions]
+        random.shuffle(round_colors)
+
+        return round_colors
+
+
+def deal_rounds(all_colors, how_many, difficulty="Normal"):
+    """
+    Batch generator that deals many rounds from the same index
+    :param all_colors: List of colors (name | score | foreground)
+    :param how_many: Number of rounds to deal
+    :param difficulty: Key from DIFFICULTY_SPREADS
+    :return: Generator of four color rounds
+    """
+    score_index = ScoreIndex(all_colors)
+    spread = score_index.spread_for(difficulty)
+
+    for item in range(how_many):
+        if spread is None:
+            # Normal - no particular spread, so choose one at random
+            score_range = score_index.distinct_scores[-1] - score_index.distinct_scores[0]
+            yield score_index.deal(random.randint(0, score_range))
+        else:
+            yield score_index.deal(spread)
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Usage: C_06_score_index.py [rounds] [difficulty]
+    rounds_wanted = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    difficulty_wanted = sys.argv[2] if len(sys.argv) > 2 else "Normal"
+
+    # Retrieve colors from the compiled catalog (or csv file)
+    all_color_list = load_catalog()
+
+    for round_colors in deal_rounds(all_color_list, rounds_wanted, difficulty_wanted):
+        scores = sorted(int(item[1]) for item in round_colors)
+        print([item[0] for item in round_colors], scores, "spread:", scores[-1] - scores[0])
@@ -0,0 +1,214 @@
+import heapq
+import random
+import time
+
+
+def rgb_to_lab(red, green, blue):
+    """
+    Converts an sRGB color to CIE Lab (so distances match what people see)
+    :param red: Red channel (0 - 255)
+    :param green: Green channel (0 - 255)
+    :param blue: Blue channel (0 - 255)
+    :return: (L, a, b) tuple
+    """
+
+    # Undo sRGB gamma
+    linear = []
+    for channel in (red, green, blue):
+        channel = channel / 255
+        if channel <= 0.04045:
+            linear.append(channel / 12.92)
+        else:
+            linear.append(((channel + 0.055) / 1.055) ** 2.4)
+    r, g, b = linear
+
+    # RGB -> XYZ (D65 white), scaled by the reference white
+    x = (r * 0.4124 + g * 0.3576 + b * 0.1805) / 0.95047
+    y = (r * 0.2126 + g * 0.7152 + b * 0.0722) / 1.00000
+    z = (r * 0.0193 + g * 0.1192 + b * 0.9505) / 1.08883
+
+    def f(t):
+        if t > 0.008856:
+            return t ** (1 / 3)
+        return 7.787 * t + 16 / 116
+
+    fx, fy, fz = f(x), f(y), f(z)
+    return 116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)
+
+
+def distance_squared(first, second):
+    """
+    Squared distance between two points (no square root needed for comparisons)
+    """
+    return sum((a - b) ** 2 for a, b in zip(first, second))
+
+
+class KDTree:
+    """
+    k-d tree over 3D points for nearest neighbour searches in logarithmic time
+    """
+
+    def __init__(self, points):
+        """
+        :param points: List of (x, y, z) tuples. Results refer to positions in this list.
+        """
+        self.points = points
+
+        # Each node is [point position, split axis, left node, right node]
+        self.root = self.build(list(range(len(points))), 0)
+
+    def build(self, positions, depth):
+        """
+        Builds the tree by splitting on the median of each axis in turn
+        """
+        if not positions:
+            return None
+
+        axis = depth % 3
+        positions.sort(key=lambda item: self.points[item][axis])
+        middle = len(positions) // 2
+
+        return [positions[middle], axis,
+                self.build(positions[:middle], depth + 1),
+                self.build(positions[middle + 1:], depth + 1)]
+
+    def nearest(self, target, k):
+        """
+        Finds the k points closest to target
+        :param target: (x, y, z) tuple
+        :param k: Number of neighbours wanted
+        :return: List of point positions, closest first
+        """
+
+        # Max heap (negated distances) holding the best k found so far
+        best = []
+        to_visit = [self.root]
+
+        while to_visit:
+            node = to_visit.pop()
+            if node is None:
+                continue
+
+            position, axis, left, right = node
+            point = self.points[position]
+
+            dist = distance_squared(point, target)
+            if len(best) < k:
+                heapq.heappush(best, (-dist, position))
+            elif dist < -best[0][0]:
+                heapq.heapreplace(best, (-dist, position))
+
+            # Visit the side the target is on last (so it's popped first), and
+            # only visit the far side if it could hold something closer
+            gap = target[axis] - point[axis]
+            near, far = (left, right) if gap < 0 else (right, left)
+            if len(best) < k or gap * gap < -best[0][0]:
+                to_visit.append(far)
+            to_visit.append(near)
+
+        return [position for dist, position in sorted(best, key=lambda item: -item[0])]
+
+
+class ColorSpaceIndex:
+    """
+    Spatial index over the catalog's colors (in Lab space) used to deal
+    rounds where all four colors look alike but have different scores
+    """
+
+    def __init__(self, all_colors, rgb_function=None):
+        """
+        :param all_colors: List of colors (name | score | foreground | hex code)
+        :param rgb_function: Optional function converting a color name to a 16 bit
+        (r, g, b) tuple, eg: a Tk widget's winfo_rgb. Without one, the hex codes
+        already in the colors are used (no Tk round trip per color).
+        """
+        self.colors = all_colors
+
+        lab_points = []
+        for item in all_colors:
+            if rgb_function is None:
+                value = int(item[3][1:], 16)
+                lab_points.append(rgb_to_lab(value >> 16, (value >> 8) & 0xFF, value & 0xFF))
+            else:
+                red, green, blue = rgb_function(item[0])
+                lab_points.append(rgb_to_lab(red // 256, green // 256, blue // 256))
+
+        if len(set(item[1] for item in all_colors)) < 4:
+            raise ValueError("At least four different scores are needed to deal a round")
+
+        self.tree = KDTree(lab_points)
+
+    def similar_colors(self, seed_position, how_many=4):
+        """
+        Finds the colors closest to the seed color, skipping any color
+        that has the same score as a color already chosen
+        :param seed_position: Position of the seed color in the catalog
+        :param how_many: Number of colors wanted (including the seed)
+        :return: List of colors, seed first
+        """
+        seed_point = self.tree.points[seed_position]
+        k = how_many * 3
+
+        while True:
+            chosen = []
+            chosen_scores = []
+            for position in self.tree.nearest(seed_point, k):
+                item = self.colors[position]
+                if item[1] not in chosen_scores:
+                    chosen.append(item)
+                    chosen_scores.append(item[1])
+                    if len(chosen) == how_many:
+                        return chosen
+
+            # Too many duplicate scores nearby, look further out
+            k *= 2
+
+    def deal(self):
+        """
+        Chooses a random seed color and its three closest lookalikes
+        :return: List of four colors in random order
+        """
+        round_colors = self.similar_colors(random.randrange(len(self.colors)))
+        random.shuffle(round_colors)
+        return round_colors
+
+
+def brute_force_nearest(points, target, k):
+    """
+    Nearest neighbours by checking every point (used to check / benchmark the tree)
+    """
+    return sorted(range(len(points)),
+                  key=lambda item: distance_squared(points[item], target))[:k]
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Benchmark the tree against a brute force scan on random palettes
+    queries = 200
+    for palette_size in [1000, 10000, 100000]:
+        palette = [rgb_to_lab(random.randrange(256), random.randrange(256),
+                              random.randrange(256)) for item in range(palette_size)]
+
+        start = time.perf_counter()
+        tree = KDTree(palette)
+        build_time = time.perf_counter() - start
+
+        targets = [random.choice(palette) for item in range(queries)]
+
+        start = time.perf_counter()
+        tree_results = [tree.nearest(target, 12) for target in targets]
+        tree_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        brute_results = [brute_force_nearest(palette, target, 12) for target in targets]
+        brute_time = time.perf_counter() - start
+
+        # Compare distances (ties could be returned in a different order)
+        for target, tree_result, brute_result in zip(targets, tree_results, brute_results):
+            assert [distance_squared(palette[item], target) for item in tree_result] == \
+                   [distance_squared(palette[item], target) for item in brute_result]
+
+        print(f"{palette_size:>7} colors | build {build_time * 1000:.0f} ms | "
+              f"tree {tree_time / queries * 1e6:.0f} us/query | "
+              f"brute force {brute_time / queries * 1e6:.0f} us/query")
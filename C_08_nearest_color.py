@@ -0,0 +1,248 @@
+from tkinter import *
+from tkinter import colorchooser
+import random
+import sys
+import time
+
+from C_03_get_all_colors import load_catalog
+from C_07_color_space_index import ColorSpaceIndex, rgb_to_lab
+
+# Bits per channel of the lookup table (each cell covers 8 x 8 x 8 hex codes)
+TABLE_BITS = 5
+
+# Cells are split until they have this few candidates (or reach the table size)
+CELL_CANDIDATES = 1
+
+# Candidate lists this short also get the (slower, tighter) plane check
+PLANE_CHECK = 64
+
+# sRGB channel (0 - 255) -> linear value, so queries skip the gamma maths
+LINEAR_CHANNEL = [channel / 255 / 12.92 if channel / 255 <= 0.04045
+                  else ((channel / 255 + 0.055) / 1.055) ** 2.4 for channel in range(256)]
+
+
+def parse_hex(hex_code):
+    """
+    Converts a hex code (eg: #FF8000, ff8000 or #F80) to red, green and blue
+    :param hex_code: Hex code as typed by the user
+    :return: (red, green, blue) tuple (0 - 255)
+    """
+    digits = hex_code.strip().lstrip("#")
+
+    # Short codes (#F80) double up each digit
+    if len(digits) == 3:
+        digits = "".join(item * 2 for item in digits)
+
+    if len(digits) != 6:
+        raise ValueError(f"{hex_code} is not a valid hex code")
+
+    value = int(digits, 16)
+    return value >> 16, (value >> 8) & 0xFF, value & 0xFF
+
+
+def lab_of(red, green, blue):
+    """
+    Same as rgb_to_lab for whole number channels, using LINEAR_CHANNEL
+    """
+    r, g, b = LINEAR_CHANNEL[red], LINEAR_CHANNEL[green], LINEAR_CHANNEL[blue]
+    x = (r * 0.4124 + g * 0.3576 + b * 0.1805) / 0.95047
+    y = r * 0.2126 + g * 0.7152 + b * 0.0722
+    z = (r * 0.0193 + g * 0.1192 + b * 0.9505) / 1.08883
+
+    fx = x ** (1 / 3) if x > 0.008856 else 7.787 * x + 16 / 116
+    fy = y ** (1 / 3) if y > 0.008856 else 7.787 * y + 16 / 116
+    fz = z ** (1 / 3) if z > 0.008856 else 7.787 * z + 16 / 116
+    return 116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)
+
+
+class NearestColorLookup:
+    """
+    Finds the closest catalog color (and its score) for any hex code.
+    The RGB cube is split into a table of TABLE_BITS bits per channel,
+    and each cell lists the only colors that can be closest to a hex
+    code inside it. Most cells have a single candidate (answered with
+    no color maths at all) and the rest compare a few candidates in Lab.
+    """
+
+    def __init__(self, all_colors, rgb_function=None):
+        """
+        :param all_colors: List of colors (name | score | foreground | hex code)
+        :param rgb_function: Optional function converting a color name to a 16 bit
+        (r, g, b) tuple (only needed if the colors don't have hex codes)
+        """
+        self.index = ColorSpaceIndex(all_colors, rgb_function)
+        self.colors = all_colors
+        self.lab_points = self.index.tree.points
+
+        # Cell -> tuple of candidate color positions
+        self.cell_shift = 8 - TABLE_BITS
+        self.table = [None] * (1 << (3 * TABLE_BITS))
+
+        # Lab values of the cube corners (shared by the cubes around them)
+        self.corner_labs = {}
+
+        self.fill_cell(0, 0, 0, 256, tuple(range(len(all_colors))))
+        self.corner_labs = None
+
+    def corner_lab(self, red, green, blue):
+        key = (red, green, blue)
+        if key not in self.corner_labs:
+            self.corner_labs[key] = lab_of(red, green, blue)
+        return self.corner_labs[key]
+
+    def fill_cell(self, red, green, blue, size, candidates):
+        """
+        Narrows down the candidates for a cube of hex codes, splitting it into
+        eight smaller cubes until few enough are left (or it's one table cell)
+        :param red: Lowest red value in the cube (likewise green and blue)
+        :param size: Width of the cube
+        :param candidates: Colors that could be closest anywhere in the parent cube
+        """
+        # Any color closest to a point in the cube is at most nearest + 2 * radius
+        # from the centre (triangle inequality). The radius is measured to the
+        # corners, with a margin as Lab bends the cube a little.
+        high = size - 1
+        centre_l, centre_a, centre_b = lab_of(red + high // 2, green + high // 2, blue + high // 2)
+        corners = [self.corner_lab(red + red_step, green + green_step, blue + blue_step)
+                   for red_step in (0, high) for green_step in (0, high) for blue_step in (0, high)]
+        radius = 0
+        for point_l, point_a, point_b in corners:
+            radius = max(radius, (point_l - centre_l) ** 2 + (point_a - centre_a) ** 2 +
+                         (point_b - centre_b) ** 2)
+        radius = radius ** 0.5 * 1.1
+
+        distances = []
+        for item in candidates:
+            point_l, point_a, point_b = self.lab_points[item]
+            distances.append(((point_l - centre_l) ** 2 + (point_a - centre_a) ** 2 +
+                              (point_b - centre_b) ** 2) ** 0.5)
+        nearest = min(distances)
+        closest = candidates[distances.index(nearest)]
+        candidates = [item for item, distance in zip(candidates, distances)
+                      if distance <= nearest + 2 * radius]
+
+        # Once there are only a few left, drop any color that is further away than
+        # the centre's closest color at every corner. Which of two colors is closer
+        # is split by a flat plane in Lab, so if all the corners are on one side the
+        # whole cube is (give or take how far Lab bends it - the margin).
+        if len(candidates) <= PLANE_CHECK:
+            bend = radius * 0.1
+            closest_l, closest_a, closest_b = self.lab_points[closest]
+            kept = [closest]
+            for item in candidates:
+                point_l, point_a, point_b = self.lab_points[item]
+                margin = 2 * bend * ((point_l - closest_l) ** 2 + (point_a - closest_a) ** 2 +
+                                     (point_b - closest_b) ** 2) ** 0.5
+                for corner_l, corner_a, corner_b in corners:
+                    if item != closest and \
+                            (corner_l - point_l) ** 2 + (corner_a - point_a) ** 2 + (corner_b - point_b) ** 2 - \
+                            (corner_l - closest_l) ** 2 - (corner_a - closest_a) ** 2 - \
+                            (corner_b - closest_b) ** 2 <= margin:
+                        kept.append(item)
+                        break
+            candidates = kept
+        candidates = tuple(candidates)
+
+        cell_size = 1 << self.cell_shift
+        if len(candidates) <= CELL_CANDIDATES or size == cell_size:
+            # Fill every table cell inside the cube
+            first = [item >> self.cell_shift for item in (red, green, blue)]
+            cells = size // cell_size
+            for red_cell in range(first[0], first[0] + cells):
+                for green_cell in range(first[1], first[1] + cells):
+                    row = (red_cell << (2 * TABLE_BITS)) | (green_cell << TABLE_BITS)
+                    for blue_cell in range(first[2], first[2] + cells):
+                        self.table[row | blue_cell] = candidates
+            return
+
+        half = size // 2
+        for red_half in (0, half):
+            for green_half in (0, half):
+                for blue_half in (0, half):
+                    self.fill_cell(red + red_half, green + green_half, blue + blue_half, half, candidates)
+
+    def nearest_rgb(self, rgb_value):
+        """
+        :param rgb_value: 24 bit color (0xRRGGBB)
+        :return: Closest color (name | score | foreground)
+        """
+        red, green, blue = rgb_value >> 16, (rgb_value >> 8) & 0xFF, rgb_value & 0xFF
+        shift = self.cell_shift
+        candidates = self.table[((red >> shift) << (2 * TABLE_BITS)) |
+                                ((green >> shift) << TABLE_BITS) | (blue >> shift)]
+        if len(candidates) == 1:
+            return self.colors[candidates[0]]
+
+        target_l, target_a, target_b = lab_of(red, green, blue)
+        best = None
+        best_distance = None
+        for item in candidates:
+            point_l, point_a, point_b = self.lab_points[item]
+            distance = (point_l - target_l) ** 2 + (point_a - target_a) ** 2 + (point_b - target_b) ** 2
+            if best_distance is None or distance < best_distance:
+                best = item
+                best_distance = distance
+        return self.colors[best]
+
+    def search(self, rgb_value):
+        """
+        Searches the spatial index directly (used to check the table)
+        :param rgb_value: 24 bit color (0xRRGGBB)
+        :return: Closest color (name | score | foreground)
+        """
+        target = rgb_to_lab(rgb_value >> 16, (rgb_value >> 8) & 0xFF, rgb_value & 0xFF)
+        position = self.index.tree.nearest(target, 1)[0]
+        return self.colors[position]
+
+    def nearest(self, hex_code):
+        """
+        :param hex_code: Hex code (eg: #FF8000)
+        :return: Closest color (name | score | foreground)
+        """
+        red, green, blue = parse_hex(hex_code)
+        return self.nearest_rgb((red << 16) | (green << 8) | blue)
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Usage: C_08_nearest_color.py [hex codes...] | --pick | --bench
+    root = Tk()
+    root.withdraw()
+
+    # Retrieve colors from the compiled catalog (or csv file)
+    all_colors = load_catalog()
+
+    start = time.perf_counter()
+    lookup = NearestColorLookup(all_colors, root.winfo_rgb)
+    build_time = time.perf_counter() - start
+
+    if "--bench" in sys.argv:
+        # Random queries (almost never repeated), checked against the k-d tree
+        queries = [random.randrange(0x1000000) for item in range(200000)]
+
+        start = time.perf_counter()
+        for item in queries:
+            lookup.nearest_rgb(item)
+        elapsed = time.perf_counter() - start
+
+        wrong = sum(1 for item in queries[:2000] if lookup.nearest_rgb(item) is not lookup.search(item))
+        print(f"Table built in {build_time:.1f} s")
+        print(f"{len(queries) / elapsed:,.0f} queries / second ({wrong} of 2000 differ from the tree)")
+
+    elif "--pick" in sys.argv:
+        # Let the user pick a color from the color chooser
+        chosen_rgb, chosen_hex = colorchooser.askcolor(title="Pick a color")
+        if chosen_hex is not None:
+            name, score = lookup.nearest(chosen_hex)[:2]
+            print(f"{chosen_hex} -> {name} (score {score})")
+
+    else:
+        for item in sys.argv[1:]:
+            try:
+                name, score = lookup.nearest(item)[:2]
+                print(f"{item} -> {name} (score {score})")
+            except ValueError as error:
+                print(error)
+
+    root.destroy()
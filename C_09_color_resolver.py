@@ -0,0 +1,101 @@
+from tkinter import *
+import json
+import os
+import sys
+
+RESOLVED_CACHE_FILE = "00_colour_rgb_cache.json"
+
+
+class ColorResolver:
+    """
+    Converts color names to #RRGGBB codes using Tk's color database. Results
+    are saved to a cache file (per Tk version) so each name is only looked up once.
+    """
+
+    def __init__(self, widget, cache_file=RESOLVED_CACHE_FILE):
+        """
+        :param widget: Any Tk widget (used for winfo_rgb)
+        :param cache_file: Name of the cache file
+        """
+        self.widget = widget
+        self.cache_file = cache_file
+
+        # Color names can resolve differently between Tk versions / platforms
+        self.tk_version = f"{widget.tk.call('info', 'patchlevel')} " \
+                          f"{widget.tk.call('tk', 'windowingsystem')}"
+
+        self.resolved = {}
+        try:
+            file = open(cache_file, 'r')
+            cache = json.load(file)
+            file.close()
+
+            if cache.get("tk_version") == self.tk_version:
+                self.resolved = cache["colors"]
+        except (OSError, ValueError):
+            pass
+
+    def resolve(self, names):
+        """
+        Looks up any names that aren't in the cache yet (and saves the cache)
+        :param names: Color names
+        :return: List of names that Tk doesn't recognise
+        """
+        unknown_names = []
+        added = False
+
+        for name in names:
+            if name in self.resolved:
+                continue
+
+            try:
+                red, green, blue = self.widget.winfo_rgb(name)
+            except TclError:
+                unknown_names.append(name)
+                continue
+
+            self.resolved[name] = f"#{red // 256:02X}{green // 256:02X}{blue // 256:02X}"
+            added = True
+
+        if added:
+            self.save()
+
+        return unknown_names
+
+    def save(self):
+        """
+        Writes the cache (via a temporary file so it's never half written)
+        """
+        temporary_file = self.cache_file + ".tmp"
+        file = open(temporary_file, 'w')
+        json.dump({"tk_version": self.tk_version, "colors": self.resolved}, file)
+        file.close()
+
+        os.replace(temporary_file, self.cache_file)
+
+    def resolve_catalog(self, all_colors):
+        """
+        Adds the resolved hex code to every color in the catalog
+        :param all_colors: List of colors (name | score | foreground)
+        :return: List of colors (name | score | foreground | hex code)
+        """
+        unknown_names = self.resolve(item[0] for item in all_colors)
+        if unknown_names:
+            raise ValueError(f"Tk doesn't recognise these colors: {', '.join(unknown_names)}")
+
+        return [[item[0], item[1], item[2], self.resolved[item[0]]] for item in all_colors]
+
+
+# Main routine
+if __name__ == "__main__":
+    root = Tk()
+    root.withdraw()
+
+    # Usage: C_09_color_resolver.py [color names...]
+    resolver = ColorResolver(root)
+    resolver.resolve(sys.argv[1:])
+
+    for item in sys.argv[1:]:
+        print(item, "->", resolver.resolved.get(item, "not found"))
+
+    root.destroy()
@@ -0,0 +1,175 @@
+from collections import OrderedDict
+import glob
+import os
+import sys
+import threading
+
+from C_03_get_all_colors import COLOR_FILE, load_catalog, catalog_file_for
+
+DEFAULT_PACK = "Classic"
+PALETTE_FOLDER = "palettes"
+
+
+def find_palette_packs(palette_folder=PALETTE_FOLDER):
+    """
+    Builds the palette registry. The classic colors are always available
+    and any csv file in the palettes folder is added as another pack
+    (eg: palettes/web_safe.csv becomes 'Web Safe')
+    :param palette_folder: Folder holding the extra palette csv files
+    :return: Dictionary of pack name -> csv file
+    """
+    palette_packs = {DEFAULT_PACK: COLOR_FILE}
+
+    for file_name in sorted(glob.glob(os.path.join(palette_folder, "*.csv"))):
+        pack_name = os.path.splitext(os.path.basename(file_name))[0]
+        pack_name = pack_name.replace("_", " ").title()
+        palette_packs[pack_name] = file_name
+
+    return palette_packs
+
+
+def palette_size(all_colors):
+    """
+    Estimates how much memory a loaded palette uses
+    :param all_colors: List of colors (each a list of strings)
+    :return: Size in bytes
+    """
+    size = sys.getsizeof(all_colors)
+    for item in all_colors:
+        size += sys.getsizeof(item) + sum(sys.getsizeof(value) for value in item)
+
+    return size
+
+
+class PaletteCache:
+    """
+    Loads palette packs the first time they are used and keeps the most
+    recently used ones in memory (up to a maximum number of bytes)
+    """
+
+    def __init__(self, palette_packs, load_function=None, max_bytes=8 * 1024 * 1024):
+        """
+        :param palette_packs: Dictionary of pack name -> csv file
+        :param load_function: Function that loads a csv file into a list of colors
+        :param max_bytes: Memory budget for loaded palettes
+        """
+        self.palette_packs = palette_packs
+        self.load_function = load_function or load_palette_file
+        self.max_bytes = max_bytes
+
+        # Least recently used pack first
+        self.loaded = OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+
+        # File size and modification time of the csv file each pack was loaded from
+        self.file_stats = {}
+
+        # Things built from a pack's colors (pack name -> build function -> result),
+        # dropped along with the pack
+        self.built = {}
+
+        # Palettes are loaded from the prefetch thread as well as the GUI
+        self.lock = threading.Lock()
+
+    def get(self, pack_name):
+        """
+        :param pack_name: Name of the palette pack
+        :return: List of colors in the pack
+        """
+        with self.lock:
+            if pack_name in self.loaded:
+                self.loaded.move_to_end(pack_name)
+                return self.loaded[pack_name]
+
+            # Checked before loading, so an edit made while loading still counts as a change
+            file_stat = read_file_stat(self.palette_packs[pack_name])
+            all_colors = self.load_function(self.palette_packs[pack_name])
+
+            self.loaded[pack_name] = all_colors
+            self.file_stats[pack_name] = file_stat
+            self.sizes[pack_name] = palette_size(all_colors)
+            self.total_bytes += self.sizes[pack_name]
+
+            # Evict least recently used packs (but never the one just loaded)
+            while self.total_bytes > self.max_bytes and len(self.loaded) > 1:
+                old_pack, old_colors = self.loaded.popitem(last=False)
+                self.total_bytes -= self.sizes.pop(old_pack)
+                self.built.pop(old_pack, None)
+                self.file_stats.pop(old_pack, None)
+
+            return all_colors
+
+    def get_built(self, pack_name, build_function):
+        """
+        Builds something from a pack's colors (eg: a ColorSpaceIndex) the first
+        time it's wanted and keeps it until the pack is replaced or evicted
+        :param pack_name: Name of the palette pack
+        :param build_function: Function taking the list of colors
+        :return: What build_function returned
+        """
+        all_colors = self.get(pack_name)
+
+        with self.lock:
+            built = self.built.setdefault(pack_name, {})
+            if build_function not in built:
+                result = build_function(all_colors)
+
+                # Don't keep it if the pack was swapped while we were getting it
+                if self.loaded.get(pack_name) is not all_colors:
+                    return result
+                built[build_function] = result
+
+            return built[build_function]
+
+    def loaded_packs(self):
+        """
+        :return: Names of the packs currently in memory
+        """
+        with self.lock:
+            return list(self.loaded)
+
+    def replace(self, pack_name, all_colors):
+        """
+        Swaps in a new version of a loaded pack (used when the csv file changes)
+        :param pack_name: Name of the palette pack
+        :param all_colors: New list of colors
+        """
+        with self.lock:
+            if pack_name not in self.loaded:
+                return
+
+            self.loaded[pack_name] = all_colors
+            self.built.pop(pack_name, None)
+            self.total_bytes -= self.sizes[pack_name]
+            self.sizes[pack_name] = palette_size(all_colors)
+            self.total_bytes += self.sizes[pack_name]
+
+
+def read_file_stat(file_name):
+    """
+    :return: (size, modification time) of the file or None if it's missing
+    """
+    try:
+        stat = os.stat(file_name)
+    except OSError:
+        return None
+
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_palette_file(color_file):
+    """
+    Loads a palette pack from its compiled catalog (or csv file)
+    """
+    return load_catalog(color_file, catalog_file_for(color_file))
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # List the available palette packs and how big they are
+    palette_cache = PaletteCache(find_palette_packs())
+    for name, file in palette_cache.palette_packs.items():
+        colors = palette_cache.get(name)
+        print(f"{name}: {len(colors)} colors from {file} ({palette_cache.sizes.get(name, 0):,} bytes)")
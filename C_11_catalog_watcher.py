@@ -0,0 +1,162 @@
+import io
+import sys
+import threading
+import time
+
+from C_03_get_all_colors import parse_colors, validate_colors
+from C_10_palette_packs import PaletteCache, find_palette_packs, read_file_stat
+
+
+class CatalogWatcher:
+    """
+    Watches the csv files of loaded palette packs on a background thread.
+    Changed files are parsed and checked in the background, then swapped
+    in by the game (between rounds) with apply_pending.
+    """
+
+    def __init__(self, palette_cache, poll_seconds=2.0):
+        """
+        :param palette_cache: PaletteCache holding the loaded packs
+        :param poll_seconds: How often to check the csv files
+        """
+        self.palette_cache = palette_cache
+        self.poll_seconds = poll_seconds
+
+        # File size and modification time of the version in use (per pack)
+        self.file_stats = {}
+
+        # Stats the packs were loaded with, as last seen (changes if a pack is loaded again)
+        self.load_stats = {}
+
+        # Changed files are only read once they stop changing
+        self.changing_stats = {}
+
+        # New versions waiting to be swapped in, and problems with rejected versions
+        self.pending = {}
+        self.errors = {}
+        self.pending_lock = threading.Lock()
+
+        self.stop_event = threading.Event()
+        self.worker = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.worker.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        """
+        Polls the csv files until stopped (runs on the worker thread)
+        """
+        while not self.stop_event.wait(self.poll_seconds):
+            for pack_name in self.palette_cache.loaded_packs():
+                self.check(pack_name)
+
+    def check(self, pack_name):
+        """
+        Checks whether a pack's csv file has changed and if so, reads,
+        parses and validates it
+        :param pack_name: Name of the palette pack
+        """
+        color_file = self.palette_cache.palette_packs[pack_name]
+        file_stat = read_file_stat(color_file)
+
+        # File is missing (eg: being replaced) - try again next time
+        if file_stat is None:
+            return
+
+        # Pack was (re)loaded since we last looked - the version in use is the
+        # one it was loaded from, so an edit made before the first poll is still seen
+        load_stat = self.palette_cache.file_stats.get(pack_name)
+        if pack_name not in self.file_stats or self.load_stats.get(pack_name) != load_stat:
+            self.load_stats[pack_name] = load_stat
+            self.file_stats[pack_name] = load_stat or file_stat
+
+        if file_stat == self.file_stats[pack_name]:
+            return
+
+        # Wait until the file has looked the same for two polls in a row
+        if self.changing_stats.get(pack_name) != file_stat:
+            self.changing_stats[pack_name] = file_stat
+            return
+
+        try:
+            file = open(color_file, 'rb')
+            contents = file.read()
+            file.close()
+        except OSError:
+            return
+
+        # Still being written to while we read it - try again next time
+        if read_file_stat(color_file) != file_stat:
+            return
+
+        self.file_stats[pack_name] = file_stat
+        del self.changing_stats[pack_name]
+
+        try:
+            all_colors = parse_colors(io.StringIO(contents.decode("utf-8")))
+        except (UnicodeDecodeError, ValueError) as error:
+            self.errors[pack_name] = [str(error)]
+            return
+
+        errors, warnings = validate_colors(all_colors)
+        if len(set(item[1] for item in all_colors)) < 4:
+            errors.append("At least four different scores are needed to deal a round")
+
+        # Keep playing with the old version if the new one has problems
+        if errors:
+            self.errors[pack_name] = errors
+            return
+
+        self.errors.pop(pack_name, None)
+        with self.pending_lock:
+            self.pending[pack_name] = [item[:3] for item in all_colors]
+
+    def apply_pending(self, prepare_function=None):
+        """
+        Swaps in any new versions (call this between rounds)
+        :param prepare_function: Optional function run on each new version before
+        it's swapped in (eg: resolving color names). ValueErrors reject the version.
+        :return: Names of the packs that were swapped
+        """
+        with self.pending_lock:
+            pending = self.pending
+            self.pending = {}
+
+        swapped = []
+        for pack_name, all_colors in pending.items():
+            if prepare_function is not None:
+                try:
+                    all_colors = prepare_function(all_colors)
+                except ValueError as error:
+                    self.errors[pack_name] = [str(error)]
+                    continue
+
+            self.palette_cache.replace(pack_name, all_colors)
+            swapped.append(pack_name)
+
+        return swapped
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Watch the classic colors and report changes (Ctrl+C to stop)
+    watched_cache = PaletteCache(find_palette_packs())
+    watched_cache.get(sys.argv[1] if len(sys.argv) > 1 else "Classic")
+
+    watcher = CatalogWatcher(watched_cache, poll_seconds=1.0)
+    watcher.start()
+
+    try:
+        while True:
+            time.sleep(1)
+            for name in watcher.apply_pending():
+                print(f"{name} reloaded ({len(watched_cache.get(name))} colors)")
+            for name, problems in list(watcher.errors.items()):
+                print(f"{name} has problems, still using the old version: {problems}")
+                del watcher.errors[name]
+    except KeyboardInterrupt:
+        watcher.stop()
@@ -0,0 +1,244 @@
+from multiprocessing import resource_tracker, shared_memory
+import atexit
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+from C_03_get_all_colors import read_colors
+
+# Header: magic | number of colors | size of the names block
+HEADER = struct.Struct("<8sII")
+MAGIC = b"CQCAT001"
+
+
+def hex_to_int(hex_code):
+    """
+    :param hex_code: #RRGGBB code (or empty)
+    :return: 24 bit color (0 if there isn't one)
+    """
+    return int(hex_code[1:], 16) if hex_code else 0
+
+
+class SharedCatalog:
+    """
+    The compiled catalog stored once in shared memory. Each column is a
+    memoryview over the shared buffer, so attaching workers don't copy
+    or parse anything.
+
+    Layout (after the header):
+    scores (int32 x n) | foregrounds (uint32 x n) | hex codes (uint32 x n) |
+    name offsets (uint32 x n + 1) | names (utf-8)
+    """
+
+    def __init__(self, memory, owner):
+        """
+        Use publish() or attach() rather than creating this directly
+        """
+        self.memory = memory
+        self.owner = owner
+
+        magic, self.count, names_size = HEADER.unpack_from(memory.buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Shared memory {memory.name} doesn't hold a color catalog")
+
+        # Column views over the shared buffer (no copies)
+        column_size = 4 * self.count
+        position = HEADER.size
+        self.scores = memory.buf[position:position + column_size].cast("i")
+        position += column_size
+        self.foregrounds = memory.buf[position:position + column_size].cast("I")
+        position += column_size
+        self.hex_codes = memory.buf[position:position + column_size].cast("I")
+        position += column_size
+        self.name_offsets = memory.buf[position:position + column_size + 4].cast("I")
+        position += column_size + 4
+        self.names = memory.buf[position:position + names_size]
+
+    @classmethod
+    def publish(cls, all_colors, segment_name=None):
+        """
+        Copies a catalog into a new shared memory segment. The segment is removed
+        when the publisher closes it (or exits).
+        :param all_colors: List of colors (name | score | foreground [| hex code])
+        :param segment_name: Optional name for the segment (random if not given)
+        :return: SharedCatalog
+        """
+        encoded_names = [item[0].encode("utf-8") for item in all_colors]
+        count = len(all_colors)
+        names_size = sum(len(item) for item in encoded_names)
+
+        memory = shared_memory.SharedMemory(name=segment_name, create=True,
+                                            size=HEADER.size + 16 * count + 4 + names_size)
+
+        HEADER.pack_into(memory.buf, 0, MAGIC, count, names_size)
+
+        # Columns first (struct type | values), then the offsets of each name
+        # and then the names themselves
+        columns = [
+            ["i", [int(item[1]) for item in all_colors]],
+            ["I", [hex_to_int(item[2]) for item in all_colors]],
+            ["I", [hex_to_int(item[3]) if len(item) > 3 else 0 for item in all_colors]]
+        ]
+
+        position = HEADER.size
+        for item in columns:
+            struct.pack_into(f"<{count}{item[0]}", memory.buf, position, *item[1])
+            position += 4 * count
+
+        offsets = [0]
+        for item in encoded_names:
+            offsets.append(offsets[-1] + len(item))
+        struct.pack_into(f"<{count + 1}I", memory.buf, position, *offsets)
+        position += 4 * (count + 1)
+
+        memory.buf[position:position + names_size] = b"".join(encoded_names)
+
+        shared_catalog = cls(memory, owner=True)
+        atexit.register(shared_catalog.close)
+        return shared_catalog
+
+    @classmethod
+    def attach(cls, segment_name, untrack=False):
+        """
+        Attaches to a catalog published by another process
+        :param segment_name: Name of the segment (SharedCatalog.memory.name)
+        :param untrack: Set this in processes that were NOT started by the publisher
+        through multiprocessing, otherwise their resource tracker removes the segment
+        when they exit
+        :return: SharedCatalog
+        """
+        if untrack and sys.version_info >= (3, 13):
+            # Python 3.13+ can attach without registering with the tracker at all
+            memory = shared_memory.SharedMemory(name=segment_name, track=False)
+        else:
+            memory = shared_memory.SharedMemory(name=segment_name)
+
+            # Older versions always register the segment. Only POSIX has a tracker
+            # for shared memory, and it knows segments by their POSIX name, which is
+            # the public name with a leading slash (memory.name leaves it off).
+            if untrack and os.name == "posix":
+                resource_tracker.unregister("/" + memory.name, "shared_memory")
+
+        return cls(memory, owner=False)
+
+    def name(self, position):
+        """
+        :return: Name of the color at position
+        """
+        start = self.name_offsets[position]
+        end = self.name_offsets[position + 1]
+        return bytes(self.names[start:end]).decode("utf-8")
+
+    def color(self, position):
+        """
+        Builds a single color in the usual list form
+        :return: Color (name | score | foreground | hex code)
+        """
+        return [self.name(position), str(self.scores[position]),
+                f"#{self.foregrounds[position]:06X}", f"#{self.hex_codes[position]:06X}"]
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        """
+        Releases the views and detaches (the publisher also removes the segment)
+        """
+        if self.memory is None:
+            return
+
+        for view in (self.scores, self.foregrounds, self.hex_codes,
+                     self.name_offsets, self.names):
+            view.release()
+
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+        self.memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def rss_kilobytes():
+    """
+    :return: Resident memory of this process in kB (Linux only, 0 elsewhere)
+    """
+    try:
+        file = open("/proc/self/status", 'r')
+        status = file.read()
+        file.close()
+    except OSError:
+        return 0
+
+    for line in status.splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1])
+    return 0
+
+
+def parsing_worker(csv_file):
+    """
+    Worker that parses its own copy of the catalog
+    :return: Memory used by the catalog (kB)
+    """
+    before = rss_kilobytes()
+    all_colors = read_colors(csv_file)
+    return rss_kilobytes() - before
+
+
+def attaching_worker(segment_name):
+    """
+    Worker that attaches to the shared catalog
+    :return: Memory used by the catalog (kB)
+    """
+    before = rss_kilobytes()
+    shared_catalog = SharedCatalog.attach(segment_name)
+
+    # Touch every score so the pages are actually mapped in
+    sum(shared_catalog.scores)
+    used = rss_kilobytes() - before
+    shared_catalog.close()
+    return used
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Compare per worker memory for a large made up catalog
+    # Usage: C_12_shared_catalog.py [colors] [workers]
+    catalog_size = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    worker_count = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    test_file = os.path.join(tempfile.mkdtemp(), "colors.csv")
+    file = open(test_file, 'w')
+    file.write("name,score,foreground\n")
+    for count in range(catalog_size):
+        file.write(f"color{count},{random.randrange(1000)},#{random.choice(['000000', 'FFFFFF'])}\n")
+    file.close()
+
+    start = time.perf_counter()
+    catalog = SharedCatalog.publish(read_colors(test_file))
+    print(f"Published {len(catalog):,} colors to {catalog.memory.name} "
+          f"({catalog.memory.size / 1024:,.0f} kB) in {time.perf_counter() - start:.2f} s")
+
+    # Spawned workers start fresh (rather than sharing the parent's memory)
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(worker_count) as pool:
+        parsed = pool.map(parsing_worker, [test_file] * worker_count)
+    with context.Pool(worker_count) as pool:
+        attached = pool.map(attaching_worker, [catalog.memory.name] * worker_count)
+
+    print(f"Parsing the csv: {sum(parsed) / worker_count:,.0f} kB extra per worker")
+    print(f"Attaching:       {sum(attached) / worker_count:,.0f} kB extra per worker "
+          f"(pages of the shared segment are shared between workers)")
+
+    catalog.close()
+    os.remove(test_file)
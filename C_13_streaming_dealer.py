@@ -0,0 +1,144 @@
+import csv
+import math
+import random
+import sys
+import time
+import tracemalloc
+
+from C_03_get_all_colors import COLOR_FILE
+
+
+def stream_colors(color_file):
+    """
+    Reads colors from a csv file one row at a time (the file is never
+    held in memory as a whole)
+    :param color_file: Name of the csv file
+    :return: Generator of colors (name | score | foreground)
+    """
+    file = open(color_file, 'r', newline="")
+    try:
+        rows = csv.reader(file, delimiter=",")
+
+        # Skip the first row
+        next(rows, None)
+
+        for item in rows:
+            if len(item) >= 3:
+                yield item
+    finally:
+        file.close()
+
+
+class DistinctScoreReservoir:
+    """
+    Weighted reservoir sample (Efraimidis-Spirakis) that keeps at most one
+    color per score. Each color gets a random key of log(u) / weight and the
+    colors with the largest keys (and different scores) are kept.
+    """
+
+    def __init__(self, size=4):
+        """
+        :param size: Number of colors wanted
+        """
+        self.size = size
+
+        # score -> (key, color) for the colors kept so far
+        self.kept = {}
+
+        # Smallest kept key once the reservoir is full (most colors
+        # can be turned away by comparing against this)
+        self.lowest_key = -math.inf
+
+    def offer(self, color, weight=1.0):
+        """
+        Offers one color to the reservoir
+        :param color: Color (name | score | foreground)
+        :param weight: How likely the color is to be chosen (must be more than zero)
+        """
+        key = math.log(1.0 - random.random()) / weight
+
+        # Can't beat any kept color
+        if key <= self.lowest_key:
+            return
+
+        score = color[1]
+
+        if score in self.kept:
+            # Same score as a kept color - keep whichever has the bigger key
+            if key > self.kept[score][0]:
+                self.kept[score] = (key, color)
+
+        elif len(self.kept) < self.size:
+            self.kept[score] = (key, color)
+
+        else:
+            # Replace the kept color with the smallest key
+            lowest_score = min(self.kept, key=lambda item: self.kept[item][0])
+            del self.kept[lowest_score]
+            self.kept[score] = (key, color)
+
+        if len(self.kept) == self.size:
+            self.lowest_key = min(item[0] for item in self.kept.values())
+
+    def colors(self):
+        """
+        :return: Chosen colors in random order
+        """
+        if len(self.kept) < self.size:
+            raise ValueError(f"At least {self.size} different scores are needed to deal a round")
+
+        round_colors = [item[1] for item in self.kept.values()]
+        random.shuffle(round_colors)
+        return round_colors
+
+
+def deal_streaming(color_file=COLOR_FILE, weight_function=None):
+    """
+    Deals one round in a single pass over the csv file
+    :param color_file: Name of the csv file
+    :param weight_function: Optional function giving each color's weight
+    :return: List of four colors with different scores
+    """
+    return deal_rounds_streaming(color_file, 1, weight_function)[0]
+
+
+def deal_rounds_streaming(color_file, how_many, weight_function=None):
+    """
+    Deals several independent rounds in a single pass over the csv file
+    (memory used depends on the number of rounds, not the size of the file)
+    :param color_file: Name of the csv file
+    :param how_many: Number of rounds to deal
+    :param weight_function: Optional function giving each color's weight
+    :return: List of rounds (each a list of four colors)
+    """
+    reservoirs = [DistinctScoreReservoir() for item in range(how_many)]
+
+    for color in stream_colors(color_file):
+        weight = 1.0 if weight_function is None else weight_function(color)
+        if weight <= 0:
+            continue
+
+        for reservoir in reservoirs:
+            reservoir.offer(color, weight)
+
+    return [reservoir.colors() for reservoir in reservoirs]
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Usage: C_13_streaming_dealer.py [csv file] [rounds]
+    csv_file = sys.argv[1] if len(sys.argv) > 1 else COLOR_FILE
+    rounds_wanted = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    dealt = deal_rounds_streaming(csv_file, rounds_wanted)
+    elapsed = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    for round_colors in dealt:
+        print([item[0] for item in round_colors], [item[1] for item in round_colors])
+
+    print(f"Dealt {rounds_wanted} round(s) in {elapsed:.2f} s, peak memory {peak_memory / 1024:,.0f} kB")
@@ -0,0 +1,207 @@
+import random
+import sys
+
+
+def build_alias_table(weights):
+    """
+    Builds a Walker / Vose alias table so weighted draws take constant time
+    :param weights: List of weights (zero or more, at least one more than zero)
+    :return: List of probabilities and list of aliases
+    """
+    count = len(weights)
+    total = sum(weights)
+
+    # Scale weights so the average is 1
+    scaled = [item * count / total for item in weights]
+    probabilities = [1.0] * count
+    aliases = list(range(count))
+
+    small = [position for position, item in enumerate(scaled) if item < 1.0]
+    large = [position for position, item in enumerate(scaled) if item >= 1.0]
+
+    # Pair each small column with a large one that tops it up to 1
+    while small and large:
+        small_position = small.pop()
+        large_position = large.pop()
+
+        probabilities[small_position] = scaled[small_position]
+        aliases[small_position] = large_position
+
+        scaled[large_position] += scaled[small_position] - 1.0
+        if scaled[large_position] < 1.0:
+            small.append(large_position)
+        else:
+            large.append(large_position)
+
+    # Anything left over is (apart from rounding errors) exactly 1
+    for position in small + large:
+        probabilities[position] = 1.0
+
+    return probabilities, aliases
+
+
+def alias_draw(probabilities, aliases):
+    """
+    :return: Position drawn from an alias table
+    """
+    position = random.randrange(len(probabilities))
+    if random.random() < probabilities[position]:
+        return position
+    return aliases[position]
+
+
+class AliasSampler:
+    """
+    Weighted sampler with O(1) draws. Weights are split into blocks, each with
+    its own alias table, and a small alias table picks the block. Changing a
+    weight only rebuilds its block and the block table.
+    """
+
+    def __init__(self, weights, block_size=64):
+        """
+        :param weights: List of weights (zero or more)
+        :param block_size: Number of weights per block
+        """
+        self.weights = list(weights)
+        self.block_size = block_size
+
+        self.block_tables = []
+        self.block_totals = []
+        for start in range(0, len(self.weights), block_size):
+            block = self.weights[start:start + block_size]
+            self.block_totals.append(sum(block))
+            self.block_tables.append(build_alias_table(block) if sum(block) > 0 else None)
+
+        self.rebuild_top_table()
+
+    def rebuild_top_table(self):
+        """
+        Rebuilds the table used to choose a block
+        """
+        if sum(self.block_totals) <= 0:
+            raise ValueError("At least one weight must be more than zero")
+
+        self.top_table = build_alias_table(self.block_totals)
+
+    def draw(self):
+        """
+        :return: Position drawn with probability proportional to its weight
+        """
+        block_number = alias_draw(*self.top_table)
+        return block_number * self.block_size + alias_draw(*self.block_tables[block_number])
+
+    def update(self, updates):
+        """
+        Changes some weights and rebuilds only the blocks they are in
+        :param updates: Dictionary of position -> new weight
+        """
+        changed_blocks = set()
+        for position, weight in updates.items():
+            self.weights[position] = weight
+            changed_blocks.add(position // self.block_size)
+
+        for block_number in changed_blocks:
+            start = block_number * self.block_size
+            block = self.weights[start:start + self.block_size]
+            self.block_totals[block_number] = sum(block)
+            self.block_tables[block_number] = build_alias_table(block) if sum(block) > 0 else None
+
+        if changed_blocks:
+            self.rebuild_top_table()
+
+
+class WeightedColorDealer:
+    """
+    Deals rounds where each color is chosen according to its weight
+    (while still making sure the four scores are all different)
+    """
+
+    def __init__(self, all_colors, weight_function=None):
+        """
+        :param all_colors: List of colors (name | score | foreground ...)
+        :param weight_function: Function giving each color's starting weight (default 1)
+        """
+        self.colors = all_colors
+        self.positions = {item[0]: position for position, item in enumerate(all_colors)}
+
+        if len(set(item[1] for item in all_colors)) < 4:
+            raise ValueError("At least four different scores are needed to deal a round")
+
+        if weight_function is None:
+            weights = [1.0] * len(all_colors)
+        else:
+            weights = [weight_function(item) for item in all_colors]
+        self.sampler = AliasSampler(weights)
+
+    def set_weights(self, new_weights):
+        """
+        :param new_weights: Dictionary of color name -> new weight
+        """
+        self.sampler.update({self.positions[name]: weight
+                             for name, weight in new_weights.items()})
+
+    def deal(self):
+        """
+        Draws colors until there are four with different scores
+        :return: List of four colors
+        """
+        round_colors = []
+        color_scores = []
+
+        while len(round_colors) < 4:
+            potential_color = self.colors[self.sampler.draw()]
+
+            if potential_color[1] not in color_scores:
+                round_colors.append(potential_color)
+                color_scores.append(potential_color[1])
+
+        return round_colors
+
+
+def chi_square_check(sampler, draws):
+    """
+    Draws from the sampler and compares the counts with the weights
+    :param sampler: AliasSampler
+    :param draws: Number of draws
+    :return: Chi-square statistic, its degrees of freedom and whether
+    it passes at the 0.1% level
+    """
+    counts = [0] * len(sampler.weights)
+    for item in range(draws):
+        counts[sampler.draw()] += 1
+
+    total_weight = sum(sampler.weights)
+    statistic = 0.0
+    freedom = -1
+    for count, weight in zip(counts, sampler.weights):
+        if weight > 0:
+            expected = draws * weight / total_weight
+            statistic += (count - expected) ** 2 / expected
+            freedom += 1
+        elif count:
+            # Something with no weight was drawn
+            return float("inf"), freedom, False
+
+    # Wilson-Hilferty approximation of the 99.9th percentile
+    z = 3.09
+    critical = freedom * (1 - 2 / (9 * freedom) + z * (2 / (9 * freedom)) ** 0.5) ** 3
+
+    return statistic, freedom, statistic < critical
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Statistical check of the sampler (before and after changing weights)
+    # Usage: C_14_alias_sampler.py [number of weights] [draws]
+    weight_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    draws_wanted = int(sys.argv[2]) if len(sys.argv) > 2 else 500000
+
+    test_weights = [random.choice([0, 1, 2, 5, 10]) * random.random() for item in range(weight_count)]
+    test_sampler = AliasSampler(test_weights)
+    print("Initial weights:  chi-square %.1f, %d degrees of freedom, pass: %s"
+          % chi_square_check(test_sampler, draws_wanted))
+
+    test_sampler.update({random.randrange(weight_count): random.random() * 20 for item in range(25)})
+    print("Updated weights:  chi-square %.1f, %d degrees of freedom, pass: %s"
+          % chi_square_check(test_sampler, draws_wanted))
@@ -0,0 +1,307 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import json
+import math
+import os
+import sys
+import tempfile
+
+from C_03_get_all_colors import COLOR_FILE, file_hash, load_catalog, catalog_file_for
+
+ANALYSIS_FILE = "00_colour_analysis.json"
+
+# Cached analyses made with a different model of the deal are worked out again
+ANALYSIS_MODEL = "sequential draw"
+
+# Quadrature points that can't change a chance by more than this are left off
+NEGLIGIBLE = 1e-18
+
+
+def target_for(low, high):
+    """
+    Score to beat for a round whose middle two scores are low and high
+    (same as round_ans((low + high) / 2) in the game)
+    """
+    return (low + high + 1) // 2
+
+
+def symmetric_sums(counts):
+    """
+    Running elementary symmetric sums e0 - e4 of the counts
+    (e2 is the number of ways to pick two colors with different scores, etc.)
+    :param counts: Number of colors with each score (lowest score first)
+    :return: List where item i holds [e0, e1, e2, e3, e4] of counts[:i]
+    """
+    sums = [[1, 0, 0, 0, 0]]
+    for count in counts:
+        e0, e1, e2, e3, e4 = sums[-1]
+        sums.append([1, e1 + count, e2 + e1 * count, e3 + e2 * count, e4 + e3 * count])
+
+    return sums
+
+
+def quadrature_nodes(total_colors, spare, scale):
+    """
+    Gauss-Legendre points and weights on [0, 1], largest point first. There are
+    enough points for the integral of a polynomial of degree total_colors - 1 to be
+    exact, but points are left off once weight * scale * y ** spare is negligible
+    (nothing below them can add to the integral)
+    :param total_colors: Number of colors in the palette
+    :param spare: Smallest power of y in every round's integrand
+    :param scale: Bound on the rest of the integrand
+    :return: List of [y, weight]
+    """
+    how_many = (total_colors + 1) // 2
+    nodes = []
+    for k in range(1, how_many + 1):
+        # Newton's method on the Legendre polynomial (starting from the usual guess)
+        x = math.cos(math.pi * (k - 0.25) / (how_many + 0.5))
+        for attempt in range(100):
+            p0, p1 = 1.0, x
+            for j in range(2, how_many + 1):
+                p0, p1 = p1, ((2 * j - 1) * x * p1 - (j - 1) * p0) / j
+            slope = how_many * (x * p1 - p0) / (x * x - 1)
+            step = p1 / slope
+            x -= step
+            if abs(step) < 1e-15:
+                break
+
+        y = (1 + x) / 2
+        weight = 1 / ((1 - x * x) * slope * slope)
+        if spare > 0 and weight * scale * y ** spare < NEGLIGIBLE:
+            break
+        nodes.append([y, weight])
+
+    return nodes
+
+
+def group_draws(counts, y):
+    """
+    Chances for each score at one point y of the draw (see analyze_colors)
+    :param counts: Number of colors with each score
+    :return: Lists of the chance each score is still waiting, the chance it was
+    drawn earlier and the density of it being drawn at y
+    """
+    waiting = [y ** count for count in counts]
+    drawn = [-math.expm1(count * math.log(y)) for count in counts]
+    drawing = [count * y ** (count - 1) for count in counts]
+    return waiting, drawn, drawing
+
+
+def draw_sums(waiting, drawn, drawing, most):
+    """
+    Running chances of how many scores were drawn at one point of the draw
+    :param most: Largest number of drawn scores that is needed
+    :return: List where item i holds [E, F] for the first i scores. E[k] is the chance
+    exactly k of them were drawn earlier and F[k] the density of exactly k being drawn
+    with the last one drawn at this point
+    """
+    sums = [[[1.0] + [0.0] * most, [0.0] * (most + 1)]]
+    for out, early, now in zip(waiting, drawn, drawing):
+        before, density = sums[-1]
+        sums.append([[before[0] * out] + [before[k] * out + before[k - 1] * early
+                                          for k in range(1, most + 1)],
+                     [0.0] + [density[k] * out + density[k - 1] * early + before[k - 1] * now
+                              for k in range(1, most + 1)]])
+
+    return sums
+
+
+def target_weights(scores, counts, nodes, positions):
+    """
+    Works out the chance of each target for rounds whose second lowest
+    score is at one of the given positions
+    :param scores: Distinct scores (lowest first)
+    :param counts: Number of colors with each score
+    :param nodes: Quadrature points (see quadrature_nodes)
+    :param positions: Positions of the second lowest score to work on
+    :return: Dictionary of target -> chance
+    """
+    weights = {}
+    for y, node_weight in nodes:
+        waiting, drawn, drawing = group_draws(counts, y)
+        below = draw_sums(waiting, drawn, drawing, 1)
+        above = draw_sums(waiting[::-1], drawn[::-1], drawing[::-1], 1)[::-1]
+
+        for low in positions:
+            # One score below low was drawn (maybe the last one), then low itself
+            low_before, low_density = below[low]
+            low_early = low_before[1] * drawn[low] * node_weight
+            low_now = (low_density[1] * drawn[low] + low_before[1] * drawing[low]) * node_weight
+            if low_early == 0 and low_now == 0:
+                continue
+
+            # Nothing between low and high is drawn
+            between = 1.0
+            for high in range(low + 1, len(scores)):
+                high_before, high_density = above[high + 1]
+                high_early = drawn[high] * high_before[1]
+                high_now = drawing[high] * high_before[1] + drawn[high] * high_density[1]
+
+                weight = between * (low_now * high_early + low_early * high_now)
+                if weight:
+                    target = target_for(scores[low], scores[high])
+                    weights[target] = weights.get(target, 0) + weight
+
+                between *= waiting[high]
+                if between == 0:
+                    break
+
+    return weights
+
+
+def analyze_colors(all_colors, workers=1):
+    """
+    Works out the distribution of the target score and the chance each color wins
+    if it's offered. Rounds are dealt the way the game does it: colors are drawn
+    one at a time, skipping any whose score is already in the round, so scores
+    that more colors share come up more often.
+
+    That draw is the same as each score being drawn at a random time (with a
+    rate equal to the number of colors that have it) and the round being the
+    first four scores drawn. Putting y = e ** -time, every chance is the integral
+    of a polynomial in y over [0, 1], which Gauss-Legendre quadrature gives
+    exactly (to within rounding).
+    :param all_colors: List of colors (name | score | foreground ...)
+    :param workers: Number of processes used for the target distribution
+    :return: Dictionary with the target distribution and per color stats
+    """
+
+    # Score histogram
+    histogram = {}
+    for item in all_colors:
+        histogram[int(item[1])] = histogram.get(int(item[1]), 0) + 1
+
+    scores = sorted(histogram)
+    counts = [histogram[item] for item in scores]
+    if len(scores) < 4:
+        raise ValueError("At least four different scores are needed to deal a round")
+
+    # Number of different rounds (4 colors with different scores)
+    total_rounds = symmetric_sums(counts)[-1][4]
+
+    # Every round leaves all but (at most) the four most common scores waiting
+    total_colors = sum(counts)
+    spare = total_colors - sum(sorted(counts)[-4:]) - 1
+    nodes = quadrature_nodes(total_colors, spare, total_colors * len(scores) ** 3)
+
+    # A color wins whenever no more than one of the other three scores is higher
+    # (it's then 3rd or 4th lowest, and the target is at most its own score)
+    winning = [0.0] * len(scores)
+    possible = [0.0] * len(scores)
+    for y, node_weight in nodes:
+        waiting, drawn, drawing = group_draws(counts, y)
+        below = draw_sums(waiting, drawn, drawing, 3)
+        above = draw_sums(waiting[::-1], drawn[::-1], drawing[::-1], 3)[::-1]
+
+        for position in range(len(scores)):
+            lower, lower_density = below[position]
+            higher, higher_density = above[position + 1]
+
+            # Three other scores were drawn - the last one drawn is this
+            # score, or one of those below / above it
+            chances = [lower_density[k] * drawn[position] * higher[3 - k]
+                       + lower[k] * drawing[position] * higher[3 - k]
+                       + lower[k] * drawn[position] * higher_density[3 - k]
+                       for k in range(4)]
+            winning[position] += (chances[2] + chances[3]) * node_weight
+            possible[position] += sum(chances) * node_weight
+
+    win_chances = {score: winning[position] / possible[position]
+                   for position, score in enumerate(scores)}
+
+    # Positions are dealt out in turn so each worker gets a similar amount of work
+    chunks = [range(start, len(scores), workers) for start in range(workers)]
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            partial_weights = list(executor.map(target_weights, repeat(scores), repeat(counts),
+                                                repeat(nodes), chunks))
+    else:
+        partial_weights = [target_weights(scores, counts, nodes, chunks[0])]
+
+    weights = {}
+    for item in partial_weights:
+        for target, weight in item.items():
+            weights[target] = weights.get(target, 0) + weight
+
+    target_distribution = {target: weights[target] for target in sorted(weights)}
+
+    color_stats = {}
+    for item in all_colors:
+        score = int(item[1])
+        color_stats[item[0]] = [score, win_chances[score], score * win_chances[score]]
+
+    return {
+        "model": ANALYSIS_MODEL,
+        "rounds": total_rounds,
+        "target_distribution": target_distribution,
+        "colors": color_stats
+    }
+
+
+def analysis_file_for(color_file):
+    """
+    :return: Name of the cached analysis for a csv file
+    """
+    if color_file == COLOR_FILE:
+        return ANALYSIS_FILE
+
+    return os.path.splitext(color_file)[0] + "_analysis.json"
+
+
+def analyze_catalog(color_file=COLOR_FILE, workers=1):
+    """
+    Analyses a palette, reusing the cached analysis if the csv hasn't changed
+    :param color_file: Name of the csv file
+    :param workers: Number of processes to use
+    :return: Analysis (see analyze_colors)
+    """
+    source_hash = file_hash(color_file)
+    analysis_file = analysis_file_for(color_file)
+
+    try:
+        file = open(analysis_file, 'r')
+        analysis = json.load(file)
+        file.close()
+
+        if analysis.get("source_hash") == source_hash and analysis.get("model") == ANALYSIS_MODEL:
+            # JSON keys are always strings
+            analysis["target_distribution"] = {int(target): chance for target, chance
+                                               in analysis["target_distribution"].items()}
+            return analysis
+    except (OSError, ValueError):
+        pass
+
+    analysis = analyze_colors(load_catalog(color_file, catalog_file_for(color_file)), workers)
+    analysis["source_hash"] = source_hash
+
+    # Each writer gets its own temporary file, so two analyses running at
+    # once (other processes, or the hint thread of another game) can't mix
+    file = tempfile.NamedTemporaryFile('w', dir=os.path.dirname(analysis_file) or ".",
+                                       prefix=os.path.basename(analysis_file) + ".",
+                                       suffix=".tmp", delete=False)
+    json.dump(analysis, file)
+    file.close()
+    os.replace(file.name, analysis_file)
+
+    return analysis
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Usage: C_15_round_analyzer.py [csv file] [workers]
+    csv_file = sys.argv[1] if len(sys.argv) > 1 else COLOR_FILE
+    workers_wanted = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+    results = analyze_catalog(csv_file, workers_wanted)
+
+    print(f"{results['rounds']:,} possible rounds\n")
+    print("Target score distribution:")
+    for target_score, chance in results["target_distribution"].items():
+        print(f"{target_score:>6} {chance * 100:6.2f}% {'#' * round(chance * 200)}")
+
+    print("\nBest colors to be offered (score | win chance | expected points):")
+    ranked = sorted(results["colors"].items(), key=lambda item: -item[1][2])
+    for name, stats in ranked[:10]:
+        print(f"{name:>20} {stats[0]:>6} {stats[1] * 100:6.1f}% {stats[2]:8.1f}")
@@ -0,0 +1,58 @@
+from abc import ABC, abstractmethod
+import random
+
+
+class BotStrategy(ABC):
+    """
+    Chooses which color button the bot presses. New strategies
+    subclass this and are added to BOT_STRATEGIES.
+    """
+
+    @abstractmethod
+    def choose(self, round_color_list, hint_table=None):
+        """
+        :param round_color_list: The four colors on the buttons (name | score | ...)
+        :param hint_table: Optional hint table (name -> score | win chance | expected points)
+        :return: Index of the button to press (0 - 3)
+        """
+
+
+class RandomBot(BotStrategy):
+    """
+    Presses any button
+    """
+
+    def choose(self, round_color_list, hint_table=None):
+        return random.randrange(len(round_color_list))
+
+
+class HintBot(BotStrategy):
+    """
+    Presses the button with the most expected points (same information as the
+    hints dialog), or a random button if there are no hints yet
+    """
+
+    def choose(self, round_color_list, hint_table=None):
+        if not hint_table:
+            return random.randrange(len(round_color_list))
+
+        expected_points = [hint_table[item[0]][2] if item[0] in hint_table else 0
+                           for item in round_color_list]
+        return expected_points.index(max(expected_points))
+
+
+class PerfectBot(BotStrategy):
+    """
+    Peeks at the scores and always presses the best color
+    """
+
+    def choose(self, round_color_list, hint_table=None):
+        scores = [int(item[1]) for item in round_color_list]
+        return scores.index(max(scores))
+
+
+BOT_STRATEGIES = {
+    "Hints": HintBot,
+    "Random": RandomBot,
+    "Perfect": PerfectBot
+}
@@ -0,0 +1,304 @@
+from array import array
+import os
+import tempfile
+
+# Rounds held in memory before they are moved to the spill file
+SPILL_ROUNDS = 1000000
+
+# Columns (name | array type | values per round) - scores fit in 16 bits
+# because packs with scores over MAX_SCORE are rejected when they load
+HISTORY_COLUMNS = [
+    ["points", "H", 1],
+    ["highest", "H", 1],
+    ["target", "H", 1],
+    ["choice", "b", 1],
+    ["won", "B", 1],
+    ["colors", "I", 4],
+    ["reaction_us", "I", 1]
+]
+COLUMN_WIDTHS = {item[0]: item[2] for item in HISTORY_COLUMNS}
+
+# Longest reaction time the reaction_us column can hold (about 71 minutes) -
+# longer ones (a game left open) are saved as this
+MAX_REACTION_US = 2 ** 32 - 1
+
+# Buckets kept for the score chart (its plot width in pixels)
+CHART_BUCKETS = 340
+
+
+class TimeHistogram:
+    """
+    Fixed size histogram of durations so summaries (mean, median, 95th
+    percentile, worst) take the same time no matter how many are recorded
+    """
+
+    def __init__(self, bucket_ns, bucket_count):
+        """
+        :param bucket_ns: Width of each bucket in nanoseconds
+        :param bucket_count: Number of buckets (longer durations go in the last one)
+        """
+        self.bucket_ns = bucket_ns
+        self.counts = array("I", bytes(4 * bucket_count))
+        self.count = 0
+        self.total_ns = 0
+        self.worst_ns = 0
+
+    def add(self, duration_ns):
+        duration_ns = max(duration_ns, 0)
+        bucket = min(duration_ns // self.bucket_ns, len(self.counts) - 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        self.worst_ns = max(self.worst_ns, duration_ns)
+
+    def percentile(self, percent):
+        """
+        :return: Upper edge of the bucket holding the percentile (in nanoseconds)
+        """
+        wanted = -(-self.count * percent // 100)
+        running = 0
+        for bucket, count in enumerate(self.counts):
+            running += count
+            if running >= wanted:
+                return min((bucket + 1) * self.bucket_ns, self.worst_ns)
+
+        return self.worst_ns
+
+    def summary(self):
+        """
+        :return: Mean, median, 95th percentile and worst in milliseconds
+        """
+        return (self.total_ns / self.count / 1e6, self.percentile(50) / 1e6,
+                self.percentile(95) / 1e6, self.worst_ns / 1e6)
+
+
+class RoundBuckets:
+    """
+    Summary of the history with at most one bucket per pixel of the score
+    chart. Each bucket covers the same number of rounds and keeps its
+    lowest and highest points, its highest possible score and how many
+    rounds were won. When the buckets run out, neighbouring buckets are
+    merged in pairs (so adding a round is quick however long the game is).
+    """
+
+    def __init__(self, max_buckets):
+        """
+        :param max_buckets: Most buckets kept (normally the chart width in pixels)
+        """
+        # max_buckets is kept even so merging in pairs leaves no bucket half done
+        self.max_buckets = max(2, max_buckets - max_buckets % 2)
+        self.bucket_rounds = 1
+
+        # Buckets (rounds | lowest points | highest points | max possible | rounds won)
+        self.buckets = []
+
+    def add_round(self, points, highest, won):
+        """
+        :param points: Points for the round
+        :param highest: Best score available in the round
+        :param won: 1 if the round was won, 0 if it was lost
+        """
+        if not self.buckets or self.buckets[-1][0] == self.bucket_rounds:
+            if len(self.buckets) == self.max_buckets:
+                self.merge()
+            self.buckets.append([1, points, points, highest, won])
+            return
+
+        bucket = self.buckets[-1]
+        bucket[0] += 1
+        bucket[1] = min(bucket[1], points)
+        bucket[2] = max(bucket[2], points)
+        bucket[3] = max(bucket[3], highest)
+        bucket[4] += won
+
+    def merge(self):
+        """
+        Merges neighbouring buckets in pairs (each bucket then covers twice as many rounds)
+        """
+        merged = []
+        for first, second in zip(self.buckets[0::2], self.buckets[1::2]):
+            merged.append([first[0] + second[0], min(first[1], second[1]),
+                           max(first[2], second[2]), max(first[3], second[3]),
+                           first[4] + second[4]])
+
+        self.buckets = merged
+        self.bucket_rounds *= 2
+
+
+class RoundHistory:
+    """
+    Round by round history kept in compact arrays, with running totals so
+    the stats never have to go through every round. Once there are too
+    many rounds to keep in memory, blocks of rounds are moved to a
+    temporary file (so memory stays flat however long the game is).
+    """
+
+    def __init__(self, spill_rounds=SPILL_ROUNDS, chart_buckets=CHART_BUCKETS):
+        """
+        :param spill_rounds: Rounds kept in memory before spilling to disk
+        :param chart_buckets: Buckets kept for the score chart
+        """
+        self.spill_rounds = spill_rounds
+        self.columns = {item[0]: array(item[1]) for item in HISTORY_COLUMNS}
+
+        # Color names are stored once and referred to by position
+        self.color_names = []
+        self.color_positions = {}
+
+        # Spilled blocks (each holds spill_rounds rounds, one column after another)
+        self.spill_file = None
+        self.spilled_rounds = 0
+
+        # Where each column starts inside a block (and how big a block is)
+        self.column_offsets = {}
+        self.block_size = 0
+        for item in HISTORY_COLUMNS:
+            self.column_offsets[item[0]] = self.block_size
+            self.block_size += self.columns[item[0]].itemsize * item[2] * spill_rounds
+
+        # Running totals
+        self.rounds = 0
+        self.rounds_won = 0
+        self.total_points = 0
+        self.max_possible = 0
+        self.best_points = 0
+
+        # Kept up to date round by round, so the chart never has to read the
+        # whole history (spilled blocks included) when it opens
+        self.round_buckets = RoundBuckets(chart_buckets)
+
+        # Functions called with the round number whenever a round is added
+        self.listeners = []
+
+        # Reaction times in 1 ms buckets (up to a minute), key to screen times in 0.1 ms
+        self.reaction_times = TimeHistogram(1000000, 60000)
+        self.input_latencies = TimeHistogram(100000, 10000)
+
+    def record(self, round_colors, choice, target, points, highest, won, reaction_ns=None):
+        """
+        Adds a round to the history
+        :param round_colors: The four colors offered (name | score | ...)
+        :param choice: Button chosen (0 - 3) or None if time ran out
+        :param target: Score to beat
+        :param points: Points earned (0 for a lost round)
+        :param highest: Best score that was available
+        :param won: Whether the round was won
+        :param reaction_ns: Time taken to choose (None if time ran out)
+        """
+        # Worked out first so nothing can fail once the columns are half written
+        reaction_us = 0 if reaction_ns is None else min(max(reaction_ns // 1000, 0), MAX_REACTION_US)
+
+        for item in round_colors:
+            if item[0] not in self.color_positions:
+                self.color_positions[item[0]] = len(self.color_names)
+                self.color_names.append(item[0])
+            self.columns["colors"].append(self.color_positions[item[0]])
+
+        self.columns["points"].append(points)
+        self.columns["highest"].append(highest)
+        self.columns["target"].append(target)
+        self.columns["choice"].append(-1 if choice is None else choice)
+        self.columns["won"].append(1 if won else 0)
+        self.columns["reaction_us"].append(reaction_us)
+
+        self.rounds += 1
+        self.total_points += points
+        self.max_possible += highest
+        self.best_points = max(self.best_points, points)
+        if won:
+            self.rounds_won += 1
+        if reaction_ns is not None:
+            self.reaction_times.add(reaction_ns)
+        self.round_buckets.add_round(points, highest, 1 if won else 0)
+
+        if len(self.columns["points"]) == self.spill_rounds:
+            self.spill()
+
+        for listener in list(self.listeners):
+            listener(self.rounds - 1)
+
+    def add_listener(self, listener):
+        """
+        :param listener: Function called with the round number after each round is recorded
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def spill(self):
+        """
+        Moves the rounds held in memory to the end of the spill file
+        """
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile()
+
+        self.spill_file.seek(0, os.SEEK_END)
+        for item in HISTORY_COLUMNS:
+            self.columns[item[0]].tofile(self.spill_file)
+            self.columns[item[0]] = array(item[1])
+
+        self.spilled_rounds += self.spill_rounds
+
+    def column_values(self, round_number, name):
+        """
+        :param round_number: Round (starting at 0)
+        :param name: Column name
+        :return: List of the column's values for that round
+        """
+        column = self.columns[name]
+        width = COLUMN_WIDTHS[name]
+
+        if round_number >= self.spilled_rounds:
+            position = (round_number - self.spilled_rounds) * width
+            return list(column[position:position + width])
+
+        # Read the values straight out of the spilled block
+        block, position = divmod(round_number, self.spill_rounds)
+        values = array(column.typecode)
+        self.spill_file.seek(block * self.block_size + self.column_offsets[name] +
+                             position * width * values.itemsize)
+        values.fromfile(self.spill_file, width)
+        return list(values)
+
+    def column_blocks(self, name):
+        """
+        Goes through a whole column a block at a time (spilled blocks first)
+        :param name: Column name
+        :return: Generator of arrays holding the column's values in round order
+        """
+        column = self.columns[name]
+        block_values = self.spill_rounds * COLUMN_WIDTHS[name]
+
+        for block in range(self.spilled_rounds // self.spill_rounds):
+            values = array(column.typecode)
+            self.spill_file.seek(block * self.block_size + self.column_offsets[name])
+            values.fromfile(self.spill_file, block_values)
+            yield values
+
+        yield column
+
+    def round_details(self, round_number):
+        """
+        :param round_number: Round (starting at 0)
+        :return: Colors offered (names), choice (None if time ran out),
+        target, points, highest and reaction time in ms (None if time ran out)
+        """
+        colors = [self.color_names[item] for item in self.column_values(round_number, "colors")]
+        choice = self.column_values(round_number, "choice")[0]
+        reaction_us = self.column_values(round_number, "reaction_us")[0]
+
+        return [colors, None if choice < 0 else choice,
+                self.column_values(round_number, "target")[0],
+                self.column_values(round_number, "points")[0],
+                self.column_values(round_number, "highest")[0],
+                None if choice < 0 else reaction_us / 1000]
+
+    def close(self):
+        """
+        Removes the spill file
+        """
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
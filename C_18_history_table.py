@@ -0,0 +1,174 @@
+from tkinter import *
+import random
+import time
+
+from C_17_round_history import RoundHistory
+
+
+class HistoryTable:
+    """
+    Scrollable round by round history. Only the rows on screen are drawn,
+    using a fixed set of row labels that are filled in again as the table
+    scrolls (so 100,000 rounds open as quickly as 10).
+    """
+
+    def __init__(self, parent, history, visible_rows=8):
+        """
+        :param parent: Frame the table goes in
+        :param history: RoundHistory to show
+        :param visible_rows: Number of rows on screen at once
+        """
+        self.history = history
+        self.visible_rows = visible_rows
+        self.first_row = 0
+
+        # Rounds in the history when the table was last drawn
+        self.drawn_rounds = 0
+
+        self.table_frame = Frame(parent, bd=1, relief="sunken")
+
+        # Columns (heading | width in characters | anchor)
+        table_columns = [
+            ["#", 6, "e"],
+            ["Colors Offered", 34, "w"],
+            ["Chosen", 14, "w"],
+            ["Target", 6, "e"],
+            ["Points", 6, "e"]
+        ]
+
+        for column, item in enumerate(table_columns):
+            heading = Label(self.table_frame, text=item[0], font="Arial 11 bold",
+                            width=item[1], anchor=item[2], bg="#DAE8FC")
+            heading.grid(row=0, column=column, sticky="EW")
+
+        # Fixed pool of row labels (reused whenever the table scrolls)
+        self.row_labels = []
+        for row in range(visible_rows):
+            row_list = []
+            for column, item in enumerate(table_columns):
+                cell = Label(self.table_frame, text="", font="Arial 11",
+                             width=item[1], anchor=item[2])
+                cell.grid(row=row + 1, column=column, sticky="EW")
+                self.bind_wheel(cell)
+                row_list.append(cell)
+            self.row_labels.append(row_list)
+
+        self.scrollbar = Scrollbar(self.table_frame, orient=VERTICAL,
+                                   command=self.yview)
+        self.scrollbar.grid(row=0, column=len(table_columns),
+                            rowspan=visible_rows + 1, sticky="NS")
+        self.bind_wheel(self.table_frame)
+
+        self.draw()
+
+    def grid(self, **options):
+        self.table_frame.grid(**options)
+
+    def bind_wheel(self, widget):
+        """
+        Scrolls the table with the mouse wheel (Windows / Mac and Linux)
+        """
+        widget.bind("<MouseWheel>", self.wheel)
+        widget.bind("<Button-4>", lambda event: self.scroll_to(self.first_row - 3))
+        widget.bind("<Button-5>", lambda event: self.scroll_to(self.first_row + 3))
+
+    def wheel(self, event):
+        # Windows reports multiples of 120, Macs report small steps
+        steps = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll_to(self.first_row - steps * 3)
+
+    def yview(self, *args):
+        """
+        Called by the scrollbar ('moveto', fraction) or ('scroll', amount, 'units' / 'pages')
+        """
+        if args[0] == "moveto":
+            self.scroll_to(round(float(args[1]) * self.history.rounds))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= self.visible_rows
+            self.scroll_to(self.first_row + amount)
+
+    def last_first_row(self):
+        """
+        :return: First row shown when scrolled all the way down
+        """
+        return max(0, self.history.rounds - self.visible_rows)
+
+    def scroll_to(self, first_row):
+        first_row = min(max(0, first_row), self.last_first_row())
+        if first_row != self.first_row:
+            self.first_row = first_row
+            self.draw()
+
+    def refresh(self):
+        """
+        Redraws after rounds have been added (following the newest
+        round if the table was already scrolled to the bottom)
+        """
+        if self.first_row >= max(0, self.drawn_rounds - self.visible_rows):
+            self.first_row = self.last_first_row()
+        self.draw()
+
+    def draw(self):
+        """
+        Fills the row labels in with the rounds on screen
+        """
+        self.drawn_rounds = self.history.rounds
+        for row, row_list in enumerate(self.row_labels):
+            round_number = self.first_row + row
+
+            if round_number >= self.history.rounds:
+                for cell in row_list:
+                    cell.config(text="", bg="#F0F0F0")
+                continue
+
+            colors, choice, target, points, highest, reaction_ms = \
+                self.history.round_details(round_number)
+
+            # Points are only ever at least the target in a round that was won
+            if choice is None:
+                chosen = "(out of time)"
+                row_bg = "#F8CECC"
+            else:
+                chosen = colors[choice]
+                row_bg = "#D5E8D4" if points >= target else "#F8CECC"
+
+            row_text = [round_number + 1, ", ".join(colors), chosen, target, points]
+            for cell, text in zip(row_list, row_text):
+                cell.config(text=text, bg=row_bg)
+
+        # Scrollbar shows the part of the history on screen
+        if self.history.rounds:
+            self.scrollbar.set(self.first_row / self.history.rounds,
+                               min(1.0, (self.first_row + self.visible_rows) / self.history.rounds))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Demo with a long made up history
+    demo_history = RoundHistory()
+    demo_names = ["red", "orange", "gold", "green", "teal", "blue", "navy", "purple", "pink", "brown"]
+    for demo_round in range(100000):
+        demo_colors = [[name, random.randint(1, 999)] for name in random.sample(demo_names, 4)]
+        demo_scores = sorted(item[1] for item in demo_colors)
+        demo_target = (demo_scores[1] + demo_scores[2] + 1) // 2
+        demo_choice = random.randrange(4)
+        demo_score = demo_colors[demo_choice][1]
+        demo_won = demo_score >= demo_target
+        demo_history.record(demo_colors, demo_choice, demo_target, demo_score if demo_won else 0,
+                            demo_scores[-1], demo_won, random.randint(300, 3000) * 1000000)
+
+    root = Tk()
+    root.title("History Table")
+
+    start = time.perf_counter()
+    demo_table = HistoryTable(root, demo_history)
+    demo_table.grid(row=0, padx=10, pady=10)
+    root.update()
+    print(f"{demo_history.rounds:,} rounds shown in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    root.mainloop()
@@ -0,0 +1,227 @@
+from tkinter import *
+import random
+import time
+
+from C_17_round_history import RoundHistory
+
+# Rounds added while the chart is open are drawn at most this often (a timer
+# rather than after_idle, as turbo demos run the idle tasks after every round)
+REDRAW_MS = 50
+
+
+class ScoreChart:
+    """
+    Chart of points per round (lowest to highest in each bucket), the
+    max possible score and the running success rate. Drawing works on
+    the history's buckets rather than rounds, so it never costs more than
+    one line per pixel, and only the buckets that changed are drawn again
+    as rounds are added.
+    """
+
+    def __init__(self, parent, history, width=420, height=160):
+        """
+        :param parent: Frame the chart goes in
+        :param history: RoundHistory to chart
+        :param width: Canvas width in pixels
+        :param height: Canvas height in pixels
+        """
+        self.history = history
+        self.width = width
+        self.height = height
+
+        # Plot area (left | top | right | bottom)
+        self.left = 40
+        self.top = 20
+        self.right = width - 40
+        self.bottom = height - 20
+
+        self.canvas = Canvas(parent, width=width, height=height, bg="#FFFFFF",
+                             highlightthickness=0)
+
+        # The history keeps the buckets up to date, so opening the chart
+        # takes the same time however many rounds have been played
+        self.round_buckets = history.round_buckets
+        self.x_step = (self.right - self.left) / self.round_buckets.max_buckets
+
+        # Buckets drawn so far (the last one may have had rounds added since),
+        # and how many rounds each bucket held when they were drawn
+        self.drawn_buckets = 0
+        self.drawn_bucket_rounds = 0
+
+        self.points_scale = 0
+        self.bar_ids = []
+        self.highest_line = None
+        self.success_line = None
+        self.redraw_id = None
+        self.rounds_label = None
+
+        self.draw_all()
+
+        # Keep up with rounds played while the chart is open
+        history.add_listener(self.round_added)
+
+    def grid(self, **options):
+        self.canvas.grid(**options)
+
+    def close(self):
+        """
+        Stops following the history (call before the chart is destroyed)
+        """
+        self.history.remove_listener(self.round_added)
+        if self.redraw_id is not None:
+            self.canvas.after_cancel(self.redraw_id)
+            self.redraw_id = None
+
+    def round_added(self, round_number):
+        """
+        Draws new rounds (several rounds in a row are drawn together)
+        """
+        if self.redraw_id is None:
+            self.redraw_id = self.canvas.after(REDRAW_MS, self.draw_changes)
+
+    def points_y(self, points):
+        return self.bottom - points / self.points_scale * (self.bottom - self.top)
+
+    def success_y(self, success_rate):
+        return self.bottom - success_rate * (self.bottom - self.top)
+
+    def draw_all(self):
+        """
+        Draws the axes, legend and every bucket
+        """
+        self.canvas.delete("all")
+        self.bar_ids = []
+
+        buckets = self.round_buckets.buckets
+        self.points_scale = max([item[3] for item in buckets] + [1])
+
+        # Axes and labels (points on the left, success rate on the right)
+        self.canvas.create_line(self.left, self.top, self.left, self.bottom,
+                                self.right, self.bottom, fill="#666666")
+        self.canvas.create_line(self.right, self.top, self.right, self.bottom, fill="#666666")
+
+        # Axis labels (text | x | anchor)
+        axis_labels = [
+            [self.points_scale, self.left - 4, "e"],
+            ["0", self.left - 4, "e"],
+            ["100%", self.right + 4, "w"],
+            ["0%", self.right + 4, "w"]
+        ]
+        for count, item in enumerate(axis_labels):
+            y = self.top if count % 2 == 0 else self.bottom
+            self.canvas.create_text(item[1], y, text=item[0], anchor=item[2], font="Arial 9")
+
+        self.rounds_label = self.canvas.create_text(self.left, self.bottom + 4, anchor="nw",
+                                                    font="Arial 9", text="")
+
+        # Legend (text | color)
+        legend = [
+            ["Points", "#6C8EBF"],
+            ["Max Possible", "#999999"],
+            ["Success Rate", "#82B366"]
+        ]
+        x = self.left
+        for item in legend:
+            self.canvas.create_rectangle(x, 6, x + 10, 14, fill=item[1], outline="")
+            label_id = self.canvas.create_text(x + 14, 10, text=item[0], anchor="w", font="Arial 9")
+            x = self.canvas.bbox(label_id)[2] + 12
+
+        self.highest_line = None
+        self.success_line = None
+        self.drawn_buckets = 0
+        self.drawn_bucket_rounds = self.round_buckets.bucket_rounds
+        self.draw_changes()
+
+    def draw_changes(self):
+        """
+        Draws the buckets that changed since last time (or everything if the
+        buckets were merged or the scale has to change)
+        """
+        self.redraw_id = None
+        round_buckets = self.round_buckets
+        buckets = round_buckets.buckets
+
+        if round_buckets.bucket_rounds != self.drawn_bucket_rounds or \
+                max([item[3] for item in buckets] + [1]) != self.points_scale:
+            self.draw_all()
+            return
+
+        # Points bars for the changed buckets (one pixel wide each)
+        for position in range(max(self.drawn_buckets - 1, 0), len(buckets)):
+            bucket = buckets[position]
+            x = self.left + position * self.x_step + 1
+            bar_top = self.points_y(bucket[2])
+            bar_bottom = min(self.points_y(bucket[1]), self.bottom - 1)
+            if position < len(self.bar_ids):
+                self.canvas.coords(self.bar_ids[position], x, bar_bottom + 1, x, bar_top)
+            else:
+                self.bar_ids.append(self.canvas.create_line(x, bar_bottom + 1, x, bar_top,
+                                                            fill="#6C8EBF"))
+
+        self.drawn_buckets = len(buckets)
+
+        # The two lines are redrawn from their points (one per bucket)
+        highest_points = []
+        success_points = []
+        rounds = 0
+        rounds_won = 0
+        for position, bucket in enumerate(buckets):
+            rounds += bucket[0]
+            rounds_won += bucket[4]
+            x = self.left + position * self.x_step + 1
+            highest_points += [x, self.points_y(bucket[3])]
+            success_points += [x, self.success_y(rounds_won / rounds)]
+
+        self.canvas.itemconfigure(self.rounds_label, text=f"{rounds:,} rounds")
+        if not buckets:
+            return
+
+        # A line needs at least two points
+        if len(buckets) == 1:
+            highest_points += [highest_points[0] + 1, highest_points[1]]
+            success_points += [success_points[0] + 1, success_points[1]]
+
+        if self.highest_line is None:
+            self.highest_line = self.canvas.create_line(highest_points, fill="#999999")
+            self.success_line = self.canvas.create_line(success_points, fill="#82B366", width=2)
+        else:
+            self.canvas.coords(self.highest_line, highest_points)
+            self.canvas.coords(self.success_line, success_points)
+        self.canvas.tag_raise(self.success_line)
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Demo: a long made up history, with more rounds added while the chart is open
+    demo_history = RoundHistory()
+    demo_names = ["red", "orange", "gold", "green", "teal", "blue", "navy", "purple", "pink", "brown"]
+
+    def add_demo_round():
+        demo_colors = [[name, random.randint(1, 999)] for name in random.sample(demo_names, 4)]
+        demo_scores = sorted(item[1] for item in demo_colors)
+        demo_target = (demo_scores[1] + demo_scores[2] + 1) // 2
+        demo_score = random.choice(demo_colors)[1]
+        demo_won = demo_score >= demo_target
+        demo_history.record(demo_colors, 0, demo_target, demo_score if demo_won else 0,
+                            demo_scores[-1], demo_won)
+
+    for demo_round in range(200000):
+        add_demo_round()
+
+    root = Tk()
+    root.title("Score Chart")
+
+    start = time.perf_counter()
+    demo_chart = ScoreChart(root, demo_history)
+    demo_chart.grid(row=0, padx=10, pady=10)
+    root.update()
+    print(f"{demo_history.rounds:,} rounds charted in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def keep_playing():
+        for item in range(50):
+            add_demo_round()
+        root.after(100, keep_playing)
+
+    keep_playing()
+    root.mainloop()
@@ -0,0 +1,422 @@
+import logging
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+HISTORY_DATABASE = "00_colour_history.db"
+
+# Rounds written together in one transaction (at most), and how long the
+# writer waits for more before writing a smaller batch
+BATCH_ROUNDS = 500
+BATCH_SECONDS = 0.25
+
+# Batches that fail are tried again with the next batch, and a few more
+# times (this far apart) before the store closes
+RETRY_SECONDS = 0.5
+CLOSE_ATTEMPTS = 3
+
+logger = logging.getLogger(__name__)
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id TEXT PRIMARY KEY,
+    player TEXT NOT NULL,
+    started TEXT NOT NULL,
+    pack TEXT,
+    difficulty TEXT,
+    rounds_wanted INTEGER,
+    rounds_played INTEGER NOT NULL DEFAULT 0,
+    rounds_won INTEGER NOT NULL DEFAULT 0,
+    total_points INTEGER NOT NULL DEFAULT 0,
+    max_possible INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS rounds (
+    game_id TEXT NOT NULL,
+    round_number INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    played TEXT NOT NULL,
+    color_1 TEXT,
+    color_2 TEXT,
+    color_3 TEXT,
+    color_4 TEXT,
+    chosen TEXT,
+    target INTEGER,
+    points INTEGER,
+    highest INTEGER,
+    won INTEGER,
+    reaction_ms REAL,
+    PRIMARY KEY (game_id, round_number)
+);
+
+-- Rollups (kept up to date as rounds are written, so lifetime stats are lookups)
+CREATE TABLE IF NOT EXISTS player_days (
+    player TEXT NOT NULL,
+    day TEXT NOT NULL,
+    games INTEGER NOT NULL,
+    rounds INTEGER NOT NULL,
+    rounds_won INTEGER NOT NULL,
+    points INTEGER NOT NULL,
+    max_possible INTEGER NOT NULL,
+    best_points INTEGER NOT NULL,
+    PRIMARY KEY (player, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS player_colors (
+    player TEXT NOT NULL,
+    color TEXT NOT NULL,
+    offered INTEGER NOT NULL,
+    chosen INTEGER NOT NULL,
+    won INTEGER NOT NULL,
+    points INTEGER NOT NULL,
+    PRIMARY KEY (player, color)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS games_player_started ON games (player, started);
+CREATE INDEX IF NOT EXISTS games_player_points ON games (player, total_points);
+CREATE INDEX IF NOT EXISTS rounds_player_played ON rounds (player, played);
+CREATE INDEX IF NOT EXISTS rounds_player_points ON rounds (player, points);
+CREATE INDEX IF NOT EXISTS rounds_player_chosen ON rounds (player, chosen, won);
+"""
+
+# Adds a batch's totals to the rollups (or starts them for a new player / day / color)
+UPSERT_PLAYER_DAY = """
+INSERT INTO player_days VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (player, day) DO UPDATE SET
+    games = games + excluded.games,
+    rounds = rounds + excluded.rounds,
+    rounds_won = rounds_won + excluded.rounds_won,
+    points = points + excluded.points,
+    max_possible = max_possible + excluded.max_possible,
+    best_points = MAX(best_points, excluded.best_points)
+"""
+
+UPSERT_PLAYER_COLOR = """
+INSERT INTO player_colors VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (player, color) DO UPDATE SET
+    offered = offered + excluded.offered,
+    chosen = chosen + excluded.chosen,
+    won = won + excluded.won,
+    points = points + excluded.points
+"""
+
+# Works the rollups out again from every stored game and round
+REBUILD_ROLLUPS = """
+DELETE FROM player_days;
+DELETE FROM player_colors;
+
+INSERT INTO player_days
+SELECT player, day, SUM(games), SUM(rounds), SUM(won), SUM(points), SUM(highest), MAX(points)
+FROM (SELECT player, substr(started, 1, 10) AS day, 1 AS games, 0 AS rounds,
+             0 AS won, 0 AS points, 0 AS highest FROM games
+      UNION ALL
+      SELECT player, played, 0, 1, won, points, highest FROM rounds)
+GROUP BY player, day;
+
+INSERT INTO player_colors
+SELECT player, color, COUNT(*), SUM(chosen), SUM(won), SUM(points)
+FROM (SELECT player, color_1 AS color, color_1 IS chosen AS chosen,
+             (color_1 IS chosen) * won AS won, (color_1 IS chosen) * points AS points FROM rounds
+      UNION ALL
+      SELECT player, color_2, color_2 IS chosen, (color_2 IS chosen) * won,
+             (color_2 IS chosen) * points FROM rounds
+      UNION ALL
+      SELECT player, color_3, color_3 IS chosen, (color_3 IS chosen) * won,
+             (color_3 IS chosen) * points FROM rounds
+      UNION ALL
+      SELECT player, color_4, color_4 IS chosen, (color_4 IS chosen) * won,
+             (color_4 IS chosen) * points FROM rounds)
+GROUP BY player, color;
+"""
+
+
+def connect(database_file):
+    """
+    Opens the database in WAL mode (so the stats can be read while rounds are being written)
+    """
+    connection = sqlite3.connect(database_file)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class HistoryStore:
+    """
+    Keeps every game and round a player has played in an SQLite database.
+    Rounds are queued and written by a background thread in batches (one
+    transaction per batch), so recording a round never waits for the disk.
+    """
+
+    def __init__(self, database_file=HISTORY_DATABASE):
+        """
+        :param database_file: Name of the SQLite database file
+        """
+        self.database_file = database_file
+
+        # Tables are made here so they exist before anything is queued or read
+        self.read_connection = connect(database_file)
+        self.read_connection.executescript(HISTORY_SCHEMA)
+
+        self.queue = queue.Queue()
+        self.game_players = {}
+
+        # Batches that couldn't be written yet, how many rounds they hold and
+        # the last error (shown with the lifetime stats until they're saved)
+        self.unwritten = []
+        self.unsaved_rounds = 0
+        self.error = None
+
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+        # Databases saved before there were rollups get them worked out once
+        has_rounds = self.read_connection.execute("SELECT EXISTS (SELECT 1 FROM rounds)").fetchone()[0]
+        has_rollups = self.read_connection.execute(
+            "SELECT EXISTS (SELECT 1 FROM player_days)").fetchone()[0]
+        if has_rounds and not has_rollups:
+            self.queue.put(["rebuild", None])
+
+    def start_game(self, player, pack=None, difficulty=None, rounds_wanted=None):
+        """
+        :return: Id of the new game (used when recording its rounds)
+        """
+        game_id = uuid.uuid4().hex
+        self.game_players[game_id] = player
+        self.queue.put(["game", [game_id, player, time.strftime("%Y-%m-%d %H:%M:%S"),
+                                 pack, difficulty, rounds_wanted]])
+        return game_id
+
+    def record_round(self, game_id, round_number, round_colors, chosen, target,
+                     points, highest, won, reaction_ms=None):
+        """
+        Queues a round to be written
+        :param game_id: Id from start_game
+        :param round_number: Round number (starting at 1)
+        :param round_colors: Names of the four colors offered
+        :param chosen: Name of the color chosen (None if time ran out)
+        :param target: Score to beat
+        :param points: Points earned
+        :param highest: Best score that was available
+        :param won: Whether the round was won
+        :param reaction_ms: Time taken to choose (None if time ran out)
+        """
+        self.queue.put(["round", [game_id, round_number, self.game_players[game_id],
+                                  time.strftime("%Y-%m-%d"), *round_colors, chosen, target,
+                                  points, highest, 1 if won else 0, reaction_ms]])
+
+    def run(self):
+        """
+        Writes queued games and rounds in batches (runs on the worker thread)
+        """
+        connection = connect(self.database_file)
+        running = True
+
+        while running:
+            batch = [self.queue.get()]
+
+            # Gather more rounds (if they come quickly) so they share a transaction
+            while len(batch) < BATCH_ROUNDS and batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get(timeout=BATCH_SECONDS))
+                except queue.Empty:
+                    break
+
+            if batch[-1] is None:
+                running = False
+
+            self.unwritten.append([item for item in batch if item is not None])
+            self.write_unwritten(connection)
+
+            # Last chance for anything that still hasn't been written
+            for attempt in range(CLOSE_ATTEMPTS if not running else 0):
+                if not self.unwritten:
+                    break
+                time.sleep(RETRY_SECONDS)
+                self.write_unwritten(connection)
+
+            for item in batch:
+                self.queue.task_done()
+
+        if self.unsaved_rounds:
+            logger.error("%d rounds could not be saved to %s: %s",
+                         self.unsaved_rounds, self.database_file, self.error)
+        connection.close()
+
+    def write_unwritten(self, connection):
+        """
+        Writes each waiting batch in its own transaction (oldest first, so one
+        bad batch can't hold up the rest) and keeps any that fail for next time
+        """
+        batches = self.unwritten
+        self.unwritten = []
+
+        for batch in batches:
+            try:
+                with connection:
+                    self.write_batch(connection, batch)
+            except sqlite3.Error as error:
+                self.unwritten.append(batch)
+                if str(error) != self.error:
+                    logger.warning("Couldn't save rounds to %s (will try again): %s",
+                                   self.database_file, error)
+                self.error = str(error)
+
+        self.unsaved_rounds = sum(1 for batch in self.unwritten for item in batch if item[0] == "round")
+        if not self.unwritten:
+            self.error = None
+
+    def write_batch(self, connection, batch):
+        """
+        Writes a batch of queued items and adds them to the rollups
+        (the caller wraps it in a transaction)
+        """
+        # Batch totals (player, day -> games | rounds | won | points | max possible | best)
+        # and (player, color -> offered | chosen | won | points)
+        day_totals = {}
+        color_totals = {}
+
+        for kind, values in batch:
+            if kind == "game":
+                connection.execute("INSERT INTO games (game_id, player, started, pack, "
+                                   "difficulty, rounds_wanted) VALUES (?, ?, ?, ?, ?, ?)", values)
+
+                totals = day_totals.setdefault((values[1], values[2][:10]), [0, 0, 0, 0, 0, 0])
+                totals[0] += 1
+
+            elif kind == "rebuild":
+                # Totals so far are already in the tables the rollups are rebuilt from
+                day_totals = {}
+                color_totals = {}
+                for statement in REBUILD_ROLLUPS.split(";"):
+                    if statement.strip():
+                        connection.execute(statement)
+
+            elif kind == "round":
+                player, day, points, highest, won = values[2], values[3], values[10], values[11], values[12]
+
+                totals = day_totals.setdefault((player, day), [0, 0, 0, 0, 0, 0])
+                totals[1] += 1
+                totals[2] += won
+                totals[3] += points
+                totals[4] += highest
+                totals[5] = max(totals[5], points)
+
+                for color in values[4:8]:
+                    totals = color_totals.setdefault((player, color), [0, 0, 0, 0])
+                    totals[0] += 1
+                    if color == values[8]:
+                        totals[1] += 1
+                        totals[2] += won
+                        totals[3] += points
+
+                connection.execute("INSERT INTO rounds VALUES "
+                                   "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", values)
+                connection.execute("UPDATE games SET rounds_played = rounds_played + 1, "
+                                   "rounds_won = rounds_won + ?, total_points = total_points + ?, "
+                                   "max_possible = max_possible + ? WHERE game_id = ?",
+                                   [values[12], values[10], values[11], values[0]])
+
+        connection.executemany(UPSERT_PLAYER_DAY, [[*key, *totals] for key, totals in day_totals.items()])
+        connection.executemany(UPSERT_PLAYER_COLOR,
+                               [[*key, *totals] for key, totals in color_totals.items()])
+
+    def rebuild_rollups(self):
+        """
+        Works the rollup tables out again from the stored rounds (waits until done)
+        """
+        self.queue.put(["rebuild", None])
+        self.flush()
+
+    def flush(self):
+        """
+        Waits until everything queued so far has been written
+        """
+        self.queue.join()
+
+    def close(self):
+        """
+        Writes anything still queued and stops the worker
+        """
+        self.queue.put(None)
+        self.worker.join()
+        self.read_connection.close()
+
+    def lifetime_stats(self, player):
+        """
+        :param player: Player name
+        :return: Games, rounds played, rounds won, total points, best game
+        total and best single round score (zeros for a new player)
+        """
+        games, rounds, rounds_won, total_points, best_round = self.read_connection.execute(
+            "SELECT SUM(games), SUM(rounds), SUM(rounds_won), SUM(points), MAX(best_points) "
+            "FROM player_days WHERE player = ?", [player]).fetchone()
+        best_game = self.read_connection.execute(
+            "SELECT MAX(total_points) FROM games WHERE player = ?", [player]).fetchone()[0]
+
+        return [games or 0, rounds or 0, rounds_won or 0, total_points or 0,
+                best_game or 0, best_round or 0]
+
+    def color_win_rates(self, player):
+        """
+        :param player: Player name
+        :return: Dictionary of color name -> [times chosen, times won]
+        """
+        rows = self.read_connection.execute(
+            "SELECT color, chosen, won FROM player_colors WHERE player = ? AND chosen > 0", [player])
+        return {item[0]: [item[1], item[2]] for item in rows}
+
+    def color_stats(self, player):
+        """
+        :param player: Player name
+        :return: Dictionary of color name -> [times offered, times chosen, times won, points]
+        """
+        rows = self.read_connection.execute(
+            "SELECT color, offered, chosen, won, points FROM player_colors WHERE player = ?", [player])
+        return {item[0]: list(item[1:]) for item in rows}
+
+
+def best_colors(win_rates, how_many=3, least_chosen=3):
+    """
+    :param win_rates: Dictionary from color_win_rates
+    :param how_many: Number of colors wanted
+    :param least_chosen: Colors chosen fewer times than this are left out
+    :return: List of the colors with the best win rate (name | chosen | won)
+    """
+    ranked = [[name, item[0], item[1]] for name, item in win_rates.items()
+              if item[0] >= least_chosen]
+    ranked.sort(key=lambda item: (-item[2] / item[1], -item[1]))
+    return ranked[:how_many]
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Usage: C_20_history_store.py [player] [database file] [--rebuild]
+    arguments = [item for item in sys.argv[1:] if not item.startswith("--")]
+    player_name = arguments[0] if arguments else "Player"
+    database = arguments[1] if len(arguments) > 1 else HISTORY_DATABASE
+
+    store = HistoryStore(database)
+
+    if "--rebuild" in sys.argv:
+        start = time.perf_counter()
+        store.rebuild_rollups()
+        print(f"Rollups rebuilt in {time.perf_counter() - start:.2f} s")
+        if store.error:
+            print("Error:", store.error)
+
+    start = time.perf_counter()
+    lifetime = store.lifetime_stats(player_name)
+    colors = best_colors(store.color_win_rates(player_name))
+    elapsed = time.perf_counter() - start
+    store.close()
+
+    print(f"{player_name}: {lifetime[0]} games, {lifetime[2]} / {lifetime[1]} rounds won, "
+          f"{lifetime[3]} points")
+    print(f"Best game: {lifetime[4]} points, best round: {lifetime[5]} points")
+    for name, chosen, won in colors:
+        print(f"{name:>20} {won} / {chosen} won ({won / chosen * 100:.0f}%)")
+    print(f"Queried in {elapsed * 1000:.1f} ms")
@@ -0,0 +1,530 @@
+import bisect
+import gzip
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+import zlib
+
+# File header, block header (magic | payload length | crc32 | records) and
+# trailer (footer offset | footer crc32 | magic)
+LOG_MAGIC = b"CQLG\x01"
+BLOCK_MAGIC = b"CQLB"
+FOOTER_MAGIC = b"CQLF"
+BLOCK_HEADER = struct.Struct("<4sIII")
+TRAILER = struct.Struct("<QI4s")
+
+# Rounds per block (each block can be checked and decoded on its own)
+BLOCK_RECORDS = 64
+
+# Record types inside a block
+ROUND_RECORD = 0
+COLOR_RECORD = 1
+GAME_RECORD = 2
+
+# Choice stored for rounds where time ran out
+NO_CHOICE = 4
+
+
+def write_varint(value, out):
+    """
+    Adds a whole number (zero or more) to out, 7 bits per byte
+    """
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, position):
+    """
+    :return: Value read and the position after it
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def zigzag(value):
+    """
+    Maps signed numbers to unsigned ones so small negatives stay small (0, -1, 1, -2 -> 0, 1, 2, 3)
+    """
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value):
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+class GameLogWriter:
+    """
+    Writes rounds to a binary log. Colors are written as positions in a
+    name table (each name is written once, the first time it is used),
+    the game, round number and time as differences from the previous
+    round, and everything as varints. Rounds are grouped in blocks with
+    their own checksum, and closing the log adds a footer with the name
+    table and where each block starts (for random access).
+    """
+
+    def __init__(self, log_file, block_records=BLOCK_RECORDS):
+        """
+        :param log_file: Name of the log file (replaced if it exists)
+        :param block_records: Rounds per block
+        """
+        self.log_file = log_file
+        self.block_records = block_records
+
+        self.file = open(log_file, 'wb')
+        self.file.write(LOG_MAGIC)
+
+        self.color_positions = {}
+        self.color_names = []
+
+        # Block index (offset | first round) and the block being built
+        self.block_index = []
+        self.rounds = 0
+        self.start_block()
+
+    def start_block(self):
+        # Differences start from zero in every block so blocks can be read on their own
+        self.block = bytearray()
+        self.block_rounds = 0
+        self.last_game = 0
+        self.last_round = 0
+        self.last_time_ms = 0
+
+    def write_game(self, game, player, time_ms):
+        """
+        Adds the start of a game to the log
+        :param game: Game number
+        :param player: Player name
+        :param time_ms: When the game started (ms since the epoch)
+        """
+        encoded = player.encode("utf-8")
+        write_varint(GAME_RECORD, self.block)
+        write_varint(game, self.block)
+        write_varint(time_ms, self.block)
+        write_varint(len(encoded), self.block)
+        self.block += encoded
+
+    def write_round(self, game, round_number, round_colors, choice, won, target,
+                    points, highest, time_ms, reaction_ms=None):
+        """
+        Adds a round to the log
+        :param game: Game number
+        :param round_number: Round number in the game
+        :param round_colors: Names of the four colors offered
+        :param choice: Button chosen (0 - 3) or None if time ran out
+        :param won: Whether the round was won
+        :param target: Score to beat
+        :param points: Points earned
+        :param highest: Best score available
+        :param time_ms: When the round was played (ms since the epoch)
+        :param reaction_ms: Time taken to choose (None if time ran out)
+        """
+        block = self.block
+
+        color_numbers = []
+        for name in round_colors:
+            if name not in self.color_positions:
+                self.color_positions[name] = len(self.color_names)
+                self.color_names.append(name)
+
+                encoded = name.encode("utf-8")
+                write_varint(COLOR_RECORD, block)
+                write_varint(self.color_positions[name], block)
+                write_varint(len(encoded), block)
+                block += encoded
+            color_numbers.append(self.color_positions[name])
+
+        write_varint(ROUND_RECORD, block)
+        write_varint(zigzag(game - self.last_game), block)
+        write_varint(zigzag(round_number - self.last_round), block)
+        write_varint(zigzag(time_ms - self.last_time_ms), block)
+        write_varint(0 if reaction_ms is None else int(reaction_ms) + 1, block)
+        for number in color_numbers:
+            write_varint(number, block)
+        write_varint((NO_CHOICE if choice is None else choice) | (8 if won else 0), block)
+        write_varint(target, block)
+        write_varint(points, block)
+        write_varint(highest, block)
+
+        self.last_game = game
+        self.last_round = round_number
+        self.last_time_ms = time_ms
+        self.block_rounds += 1
+        self.rounds += 1
+
+        if self.block_rounds == self.block_records:
+            self.write_block()
+
+    def write_block(self):
+        """
+        Writes the block being built (with its checksum) to the file
+        """
+        if self.block_rounds == 0 and not self.block:
+            return
+
+        self.block_index.append([self.file.tell(), self.rounds - self.block_rounds])
+        self.file.write(BLOCK_HEADER.pack(BLOCK_MAGIC, len(self.block),
+                                          zlib.crc32(self.block), self.block_rounds))
+        self.file.write(self.block)
+        self.start_block()
+
+    def flush(self):
+        """
+        Writes the rounds so far (as a short block) so they survive a crash
+        """
+        self.write_block()
+        self.file.flush()
+
+    def close(self):
+        """
+        Writes the last block and the footer
+        """
+        self.write_block()
+
+        footer = bytearray(FOOTER_MAGIC)
+        write_varint(len(self.color_names), footer)
+        for name in self.color_names:
+            encoded = name.encode("utf-8")
+            write_varint(len(encoded), footer)
+            footer += encoded
+
+        write_varint(len(self.block_index), footer)
+        for offset, first_round in self.block_index:
+            write_varint(offset, footer)
+            write_varint(first_round, footer)
+
+        footer_offset = self.file.tell()
+        self.file.write(footer)
+        self.file.write(TRAILER.pack(footer_offset, zlib.crc32(footer), FOOTER_MAGIC))
+        self.file.close()
+
+
+def decode_block(payload, color_names, games=None):
+    """
+    Decodes the rounds in one block
+    :param payload: Block contents (after the header)
+    :param color_names: Name table (names defined in the block are added to it)
+    :param games: Optional dictionary that games started in the block are
+    added to (game number -> player | start time in ms)
+    :return: List of rounds (game | round number | colors | choice | won |
+    target | points | highest | time in ms | reaction in ms)
+    """
+    rounds = []
+    game = 0
+    round_number = 0
+    time_ms = 0
+    position = 0
+
+    while position < len(payload):
+        record_type, position = read_varint(payload, position)
+
+        if record_type == COLOR_RECORD:
+            # Names may already be known (eg: from the footer)
+            name_position, position = read_varint(payload, position)
+            length, position = read_varint(payload, position)
+            if name_position == len(color_names):
+                color_names.append(bytes(payload[position:position + length]).decode("utf-8"))
+            position += length
+            continue
+
+        if record_type == GAME_RECORD:
+            game_number, position = read_varint(payload, position)
+            started_ms, position = read_varint(payload, position)
+            length, position = read_varint(payload, position)
+            if games is not None:
+                games[game_number] = [bytes(payload[position:position + length]).decode("utf-8"),
+                                      started_ms]
+            position += length
+            continue
+
+        # Most values fit in one byte, so those are read without a function call
+        values = []
+        for count in range(12):
+            byte = payload[position]
+            if byte < 0x80:
+                values.append(byte)
+                position += 1
+            else:
+                value, position = read_varint(payload, position)
+                values.append(value)
+
+        game += unzigzag(values[0])
+        round_number += unzigzag(values[1])
+        time_ms += unzigzag(values[2])
+        choice = values[8] & 7
+
+        rounds.append([game, round_number, [color_names[item] for item in values[4:8]],
+                       None if choice == NO_CHOICE else choice, values[8] & 8 != 0,
+                       values[9], values[10], values[11], time_ms,
+                       None if values[3] == 0 else values[3] - 1])
+
+    return rounds
+
+
+def read_block(data, offset):
+    """
+    Reads and checks the block at offset
+    :return: Payload, number of rounds and offset of the next block (None
+    if there isn't a whole block there, eg: the end of a log that wasn't closed)
+    """
+    if offset + BLOCK_HEADER.size > len(data) or data[offset:offset + 4] != BLOCK_MAGIC:
+        return None
+
+    magic, length, checksum, rounds = BLOCK_HEADER.unpack_from(data, offset)
+    start = offset + BLOCK_HEADER.size
+    if start + length > len(data):
+        return None
+
+    payload = data[start:start + length]
+    if zlib.crc32(payload) != checksum:
+        raise ValueError(f"Block at byte {offset} is damaged (checksum does not match)")
+
+    return payload, rounds, start + length
+
+
+def read_log(log_file, games=None):
+    """
+    Reads a log from start to finish, one block at a time
+    :param log_file: Name of the log file (.gz files are read compressed)
+    :param games: Optional dictionary games are added to (see decode_block)
+    :return: Generator of rounds (see decode_block)
+    """
+    if log_file.endswith(".gz"):
+        file = gzip.open(log_file, 'rb')
+    else:
+        file = open(log_file, 'rb')
+    try:
+        if file.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError(f"{log_file} is not a game log")
+
+        color_names = []
+        while True:
+            offset = file.tell()
+            header = file.read(BLOCK_HEADER.size)
+            if len(header) < BLOCK_HEADER.size or header[:4] != BLOCK_MAGIC:
+                break
+
+            magic, length, checksum, rounds = BLOCK_HEADER.unpack(header)
+            payload = file.read(length)
+
+            # Last block of a log that wasn't closed properly
+            if len(payload) < length:
+                break
+
+            if zlib.crc32(payload) != checksum:
+                raise ValueError(f"Block at byte {offset} is damaged (checksum does not match)")
+
+            for item in decode_block(payload, color_names, games):
+                yield item
+    finally:
+        file.close()
+
+
+class MappedGameLog:
+    """
+    Random access to the rounds in a log through a memory map. The footer
+    says where each block starts, so finding a round is a binary search
+    and decoding one block. Logs without a footer (not closed properly)
+    are indexed by walking through the block headers.
+    """
+
+    def __init__(self, log_file):
+        self.file = open(log_file, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.data[:len(LOG_MAGIC)] != LOG_MAGIC:
+            raise ValueError(f"{log_file} is not a game log")
+
+        self.color_names = []
+        self.block_offsets = []
+        self.first_rounds = []
+        self.rounds = 0
+
+        if not self.read_footer():
+            self.scan_blocks()
+
+        # Most recently decoded block (rounds next to each other are usually read together)
+        self.cached_block = None
+        self.cached_rounds = []
+
+    def read_footer(self):
+        """
+        :return: Whether there was a valid footer
+        """
+        data = self.data
+        if len(data) < len(LOG_MAGIC) + TRAILER.size:
+            return False
+
+        footer_offset, checksum, magic = TRAILER.unpack_from(data, len(data) - TRAILER.size)
+        if magic != FOOTER_MAGIC or footer_offset >= len(data):
+            return False
+
+        footer = data[footer_offset:len(data) - TRAILER.size]
+        if zlib.crc32(footer) != checksum:
+            return False
+
+        position = len(FOOTER_MAGIC)
+        name_count, position = read_varint(footer, position)
+        for count in range(name_count):
+            length, position = read_varint(footer, position)
+            self.color_names.append(footer[position:position + length].decode("utf-8"))
+            position += length
+
+        block_count, position = read_varint(footer, position)
+        for count in range(block_count):
+            offset, position = read_varint(footer, position)
+            first_round, position = read_varint(footer, position)
+            self.block_offsets.append(offset)
+            self.first_rounds.append(first_round)
+
+        # The last block's size comes from its header
+        if self.block_offsets:
+            self.rounds = self.first_rounds[-1] + BLOCK_HEADER.unpack_from(data, self.block_offsets[-1])[3]
+
+        return True
+
+    def scan_blocks(self):
+        """
+        Builds the block index (and name table) by walking through the blocks
+        """
+        offset = len(LOG_MAGIC)
+        while True:
+            block = read_block(self.data, offset)
+            if block is None:
+                break
+
+            self.block_offsets.append(offset)
+            self.first_rounds.append(self.rounds)
+            decode_block(block[0], self.color_names)
+            self.rounds += block[1]
+            offset = block[2]
+
+    def __len__(self):
+        return self.rounds
+
+    def __getitem__(self, round_number):
+        """
+        :param round_number: Round in the log (starting at 0)
+        :return: The round (see decode_block)
+        """
+        if not 0 <= round_number < self.rounds:
+            raise IndexError("round number out of range")
+
+        block_number = bisect.bisect_right(self.first_rounds, round_number) - 1
+        if block_number != self.cached_block:
+            payload = read_block(self.data, self.block_offsets[block_number])[0]
+
+            # Names are already known from the footer or the scan
+            self.cached_rounds = decode_block(payload, self.color_names)
+            self.cached_block = block_number
+
+        return self.cached_rounds[round_number - self.first_rounds[block_number]]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def make_rounds(how_many, color_count=500):
+    """
+    Makes up rounds for testing (games of 10 - 50 rounds)
+    """
+    color_names = [f"color {item}" for item in range(color_count)]
+    rounds = []
+    game = 0
+    round_number = 0
+    game_length = 0
+    time_ms = int(time.time() * 1000)
+
+    for count in range(how_many):
+        if round_number == game_length:
+            game += 1
+            round_number = 0
+            game_length = random.randint(10, 50)
+        round_number += 1
+        time_ms += random.randint(500, 5000)
+
+        choice = random.choice([0, 1, 2, 3, 0, 1, 2, 3, None])
+        target = random.randint(100, 600)
+        points = random.choice([0, random.randint(target, 999)])
+        rounds.append([game, round_number, random.sample(color_names, 4), choice,
+                       choice is not None and points > 0, target,
+                       points if choice is not None else 0, 999, time_ms,
+                       None if choice is None else random.randint(300, 4000)])
+
+    return rounds
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Compares the binary log with JSON lines (size, write and read speed)
+    # Usage: C_21_game_log.py [rounds]
+    rounds_wanted = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    test_rounds = make_rounds(rounds_wanted)
+
+    binary_file = "test_game_log.cqlog"
+    json_file = "test_game_log.jsonl"
+
+    start = time.perf_counter()
+    writer = GameLogWriter(binary_file)
+    for item in test_rounds:
+        writer.write_round(*item)
+    writer.close()
+    binary_write = time.perf_counter() - start
+
+    start = time.perf_counter()
+    file = open(json_file, 'w')
+    for item in test_rounds:
+        file.write(json.dumps(item) + "\n")
+    file.close()
+    json_write = time.perf_counter() - start
+
+    start = time.perf_counter()
+    binary_rounds = list(read_log(binary_file))
+    binary_read = time.perf_counter() - start
+
+    start = time.perf_counter()
+    file = open(json_file, 'r')
+    json_rounds = [json.loads(line) for line in file]
+    file.close()
+    json_read = time.perf_counter() - start
+
+    if binary_rounds != test_rounds or json_rounds != test_rounds:
+        print("Error: rounds read back do not match")
+
+    # Random access (binary log only - JSON lines would have to be read up to the round)
+    mapped_log = MappedGameLog(binary_file)
+    positions = [random.randrange(rounds_wanted) for item in range(10000)]
+    start = time.perf_counter()
+    for position in positions:
+        if mapped_log[position] != test_rounds[position]:
+            print("Error: random access round does not match")
+            break
+    random_read = time.perf_counter() - start
+    mapped_log.close()
+
+    binary_size = os.path.getsize(binary_file)
+    json_size = os.path.getsize(json_file)
+
+    print(f"{rounds_wanted:,} rounds")
+    print(f"Binary log:  {binary_size:>12,} bytes ({binary_size / rounds_wanted:.1f} per round), "
+          f"write {rounds_wanted / binary_write:,.0f} rounds/s, read {rounds_wanted / binary_read:,.0f} rounds/s")
+    print(f"JSON lines:  {json_size:>12,} bytes ({json_size / rounds_wanted:.1f} per round), "
+          f"write {rounds_wanted / json_write:,.0f} rounds/s, read {rounds_wanted / json_read:,.0f} rounds/s")
+    print(f"Random access: {len(positions) / random_read:,.0f} rounds/s")
+
+    os.remove(binary_file)
+    os.remove(json_file)
@@ -0,0 +1,434 @@
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+
+from C_21_game_log import GameLogWriter, read_log
+
+LOG_FOLDER = "game_logs"
+
+# Rounds per segment (a snapshot is saved each time a segment is closed)
+SEGMENT_ROUNDS = 100000
+
+# Unsaved rounds are written out at least this often
+FLUSH_SECONDS = 5.0
+
+# Snapshots kept (older ones are removed)
+KEEP_SNAPSHOTS = 2
+
+SEGMENT_NAME = re.compile(r"segment_(\d+)\.cqlog(\.gz)?$")
+SNAPSHOT_NAME = re.compile(r"snapshot_(\d+)\.json$")
+
+logger = logging.getLogger(__name__)
+
+
+class LogSummary:
+    """
+    Running totals worked out from the log (overall, per player and per
+    color). Games are only kept separately until they finish, then they
+    are added to their player's totals, so the summary stays the same
+    size however many games are played. Saved as a snapshot whenever a
+    segment is closed, so they never have to be worked out from the
+    whole log again.
+    """
+
+    def __init__(self):
+        self.rounds = 0
+        self.rounds_won = 0
+        self.total_points = 0
+        self.max_possible = 0
+
+        # Games still being played (number -> player | started ms | rounds | won |
+        # points | max possible | last round ms) and the highest game number seen
+        self.games = {}
+        self.last_game = 0
+
+        # Finished games (player -> games | rounds | won | points | max possible | last round ms)
+        self.players = {}
+
+        # Colors (name -> offered | chosen | won)
+        self.colors = {}
+
+        # Segments included so far (all of them up to and including this one)
+        self.last_segment = 0
+
+    def add_game(self, game, player, started_ms):
+        # Games carried on into a new segment are logged again there
+        if game not in self.games:
+            self.games[game] = [player, started_ms, 0, 0, 0, 0, started_ms]
+            self.last_game = max(self.last_game, game)
+        elif not self.games[game][0]:
+            self.games[game][0] = player
+
+    def finish_game(self, game):
+        """
+        Adds a finished game to its player's totals
+        """
+        if game not in self.games:
+            return
+
+        player, started_ms, rounds, won, points, max_possible, last_ms = self.games.pop(game)
+        player_totals = self.players.setdefault(player, [0, 0, 0, 0, 0, 0])
+        player_totals[0] += 1
+        player_totals[1] += rounds
+        player_totals[2] += won
+        player_totals[3] += points
+        player_totals[4] += max_possible
+        player_totals[5] = max(player_totals[5], last_ms)
+
+    def add_round(self, item):
+        """
+        :param item: Round read from the log (see decode_block)
+        """
+        game, round_number, round_colors, choice, won, target, points, highest, time_ms = item[:9]
+
+        self.rounds += 1
+        self.rounds_won += won
+        self.total_points += points
+        self.max_possible += highest
+
+        # Games that started before the log did are still counted
+        if game not in self.games:
+            self.add_game(game, "", time_ms)
+        game_totals = self.games[game]
+        game_totals[2] += 1
+        game_totals[3] += won
+        game_totals[4] += points
+        game_totals[5] += highest
+        game_totals[6] = time_ms
+
+        for position, name in enumerate(round_colors):
+            color_totals = self.colors.setdefault(name, [0, 0, 0])
+            color_totals[0] += 1
+            if position == choice:
+                color_totals[1] += 1
+                color_totals[2] += won
+
+    def to_json(self):
+        """
+        :return: Copy of the totals (safe to save on another thread while
+        rounds are still being added)
+        """
+        return {
+            "last_segment": self.last_segment,
+            "rounds": self.rounds,
+            "rounds_won": self.rounds_won,
+            "total_points": self.total_points,
+            "max_possible": self.max_possible,
+            "last_game": self.last_game,
+            "games": {game: list(totals) for game, totals in self.games.items()},
+            "players": {player: list(totals) for player, totals in self.players.items()},
+            "colors": {name: list(totals) for name, totals in self.colors.items()}
+        }
+
+    @staticmethod
+    def from_json(values):
+        summary = LogSummary()
+        summary.last_segment = values["last_segment"]
+        summary.rounds = values["rounds"]
+        summary.rounds_won = values["rounds_won"]
+        summary.total_points = values["total_points"]
+        summary.max_possible = values["max_possible"]
+
+        # JSON keys are always strings (snapshots from before games were added
+        # to player totals hold every game, and no player totals)
+        summary.games = {int(game): totals for game, totals in values["games"].items()}
+        summary.last_game = values.get("last_game", max(summary.games, default=0))
+        summary.players = values.get("players", {})
+        summary.colors = values["colors"]
+        return summary
+
+
+def segment_files(log_folder):
+    """
+    :return: List of (segment number | file name) in order, preferring the
+    uncompressed file if a segment is half way through being compacted
+    """
+    segments = {}
+    for name in os.listdir(log_folder):
+        match = SEGMENT_NAME.match(name)
+        if match and (int(match.group(1)) not in segments or not match.group(2)):
+            segments[int(match.group(1))] = os.path.join(log_folder, name)
+
+    return sorted(segments.items())
+
+
+def compact_segment(segment_file):
+    """
+    Compresses a closed segment (the original is only removed once the
+    compressed copy is complete)
+    """
+    temporary_file = segment_file + ".gz.tmp"
+    source = open(segment_file, 'rb')
+    target = gzip.open(temporary_file, 'wb')
+    shutil.copyfileobj(source, target)
+    target.close()
+    source.close()
+
+    os.replace(temporary_file, segment_file + ".gz")
+    os.remove(segment_file)
+
+
+class GameLogManager:
+    """
+    Logs rounds to a folder of segments. Each segment holds up to
+    SEGMENT_ROUNDS rounds; when it's full it is closed, a snapshot of the
+    totals is saved and the segment is compressed in the background.
+    Starting up loads the newest snapshot and only reads the segments
+    written after it.
+    """
+
+    def __init__(self, log_folder=LOG_FOLDER, segment_rounds=SEGMENT_ROUNDS):
+        """
+        :param log_folder: Folder holding the segments and snapshots
+        :param segment_rounds: Rounds per segment
+        """
+        self.log_folder = log_folder
+        self.segment_rounds = segment_rounds
+        os.makedirs(log_folder, exist_ok=True)
+
+        self.tail_segments = 0
+        self.summary = self.load_summary()
+        self.next_game = self.summary.last_game + 1
+
+        # Games left from last time are over (the game may have been closed
+        # without ending them)
+        unfinished_games = len(self.summary.games)
+        for game in list(self.summary.games):
+            self.summary.finish_game(game)
+
+        # Snapshots are written in the background (one at a time)
+        self.snapshot_thread = None
+
+        # Segments left from last time are finished with (the newest may not
+        # have been closed properly, but the readers cope with that), so the
+        # tail goes into a snapshot and isn't read again next time
+        if self.tail_segments or unfinished_games:
+            self.save_snapshot()
+
+        # A damaged segment that was moved aside keeps its number
+        closed_segments = segment_files(log_folder)
+        self.segment = max(closed_segments[-1][0] if closed_segments else 0, self.summary.last_segment)
+
+        # The next segment is only started once there is something to write
+        self.writer = None
+        self.writing_segment = None
+        self.last_flush = time.monotonic()
+
+        self.compact_thread = None
+        self.start_compacting()
+
+    def load_summary(self):
+        """
+        Loads the newest snapshot that can be read and adds the segments written after it
+        """
+        snapshots = []
+        for name in os.listdir(self.log_folder):
+            match = SNAPSHOT_NAME.match(name)
+            if match:
+                snapshots.append([int(match.group(1)), os.path.join(self.log_folder, name)])
+
+        summary = LogSummary()
+        for segment, snapshot_file in sorted(snapshots, reverse=True):
+            try:
+                file = open(snapshot_file, 'r')
+                summary = LogSummary.from_json(json.load(file))
+                file.close()
+                break
+            except (OSError, ValueError, KeyError):
+                continue
+
+        # Tail - segments the snapshot doesn't include yet
+        for segment, segment_file in segment_files(self.log_folder):
+            if segment <= summary.last_segment:
+                continue
+
+            # Games are read a block at a time, before that block's rounds
+            games = {}
+            rounds_read = 0
+            try:
+                for item in read_log(segment_file, games):
+                    for game, values in games.items():
+                        summary.add_game(game, *values)
+                    games.clear()
+                    summary.add_round(item)
+                    rounds_read += 1
+            except (ValueError, OSError, EOFError) as error:
+                # Rounds before the damage are kept. The rest of the segment is
+                # dropped (later blocks can use color names from the damaged one),
+                # and the segment is moved aside so nothing else tries to read it.
+                damaged_file = segment_file + ".damaged"
+                try:
+                    os.replace(segment_file, damaged_file)
+                except OSError:
+                    damaged_file = segment_file
+                logger.warning("%s is damaged (%s): kept the %d rounds before the damage, "
+                               "dropped the rest of the segment (left in %s)",
+                               segment_file, error, rounds_read, damaged_file)
+            for game, values in games.items():
+                summary.add_game(game, *values)
+
+            summary.last_segment = segment
+            self.tail_segments += 1
+
+        return summary
+
+    def segment_file(self, segment):
+        return os.path.join(self.log_folder, f"segment_{segment:06d}.cqlog")
+
+    def start_segment(self):
+        self.segment += 1
+        self.writing_segment = self.segment
+        self.writer = GameLogWriter(self.segment_file(self.segment))
+
+    def start_game(self, player):
+        """
+        :param player: Player name
+        :return: Game number (used when logging its rounds)
+        """
+        game = self.next_game
+        self.next_game += 1
+
+        if self.writer is None:
+            self.start_segment()
+
+        started_ms = int(time.time() * 1000)
+        self.writer.write_game(game, player, started_ms)
+        self.summary.add_game(game, player, started_ms)
+        return game
+
+    def finish_game(self, game):
+        """
+        Writes the game's unsaved rounds to disk and adds it to the player's
+        totals (call when the game is closed)
+        """
+        self.flush()
+        self.summary.finish_game(game)
+
+    def log_round(self, game, round_number, round_colors, choice, won, target,
+                  points, highest, reaction_ms=None):
+        """
+        Logs a round (see GameLogWriter.write_round), rotating to a new
+        segment once this one is full
+        """
+        item = [game, round_number, round_colors, choice, won, target, points, highest,
+                int(time.time() * 1000), reaction_ms]
+        self.writer.write_round(*item)
+        self.summary.add_round(item)
+
+        # Games continue into the next segment, so it starts with the game's record
+        if self.writer.rounds >= self.segment_rounds:
+            self.rotate()
+            self.writer.write_game(game, self.summary.games[game][0], self.summary.games[game][1])
+
+        elif time.monotonic() - self.last_flush > FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes unsaved rounds to disk (call at the end of a game)
+        """
+        if self.writer is not None:
+            self.writer.flush()
+        self.last_flush = time.monotonic()
+
+    def rotate(self):
+        """
+        Closes the segment, saves a snapshot and starts a new segment
+        """
+        self.writer.close()
+        self.summary.last_segment = self.segment
+        self.save_snapshot()
+        self.start_segment()
+        self.start_compacting()
+
+    def save_snapshot(self):
+        """
+        Saves a copy of the totals on a background thread (waiting for the
+        last snapshot first, so they are written in order)
+        """
+        if self.snapshot_thread is not None:
+            self.snapshot_thread.join()
+
+        self.snapshot_thread = threading.Thread(target=self.write_snapshot, daemon=True,
+                                                args=[self.summary.to_json()])
+        self.snapshot_thread.start()
+
+    def write_snapshot(self, values):
+        """
+        Writes a snapshot and removes older ones (runs on the snapshot thread)
+        :param values: Totals to save (see LogSummary.to_json)
+        """
+        snapshot_file = os.path.join(self.log_folder, f"snapshot_{values['last_segment']:06d}.json")
+        temporary_file = snapshot_file + ".tmp"
+        file = open(temporary_file, 'w')
+        json.dump(values, file)
+        file.close()
+        os.replace(temporary_file, snapshot_file)
+
+        # Remove older snapshots
+        snapshots = sorted(name for name in os.listdir(self.log_folder) if SNAPSHOT_NAME.match(name))
+        for name in snapshots[:-KEEP_SNAPSHOTS]:
+            os.remove(os.path.join(self.log_folder, name))
+
+    def start_compacting(self):
+        """
+        Compresses closed segments on a background thread (one at a time)
+        """
+        if self.compact_thread is not None and self.compact_thread.is_alive():
+            return
+
+        self.compact_thread = threading.Thread(target=self.compact, daemon=True)
+        self.compact_thread.start()
+
+    def compact(self):
+        """
+        Compresses every closed segment that isn't compressed yet, including
+        any closed while this was running (runs on the worker thread)
+        """
+        compacting = True
+        while compacting:
+            compacting = False
+            for segment, segment_file in segment_files(self.log_folder):
+                if segment != self.writing_segment and not segment_file.endswith(".gz"):
+                    try:
+                        compact_segment(segment_file)
+                        compacting = True
+                    except OSError:
+                        pass
+
+    def close(self):
+        """
+        Closes the segment being written (it gets compacted next time)
+        """
+        if self.writer is not None:
+            self.writer.close()
+        if self.snapshot_thread is not None:
+            self.snapshot_thread.join()
+        if self.compact_thread is not None:
+            self.compact_thread.join()
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Usage: C_22_log_segments.py [log folder]
+    folder = sys.argv[1] if len(sys.argv) > 1 else LOG_FOLDER
+
+    start = time.perf_counter()
+    manager = GameLogManager(folder)
+    elapsed = time.perf_counter() - start
+
+    print(f"Loaded in {elapsed * 1000:.0f} ms (snapshot up to segment {manager.summary.last_segment})")
+    print(f"{manager.summary.last_game:,} games by {len(manager.summary.players):,} players, "
+          f"{manager.summary.rounds:,} rounds, "
+          f"{manager.summary.rounds_won:,} won, {manager.summary.total_points:,} points")
+    for segment_number, name in segment_files(folder):
+        print(f"{name:>40} {os.path.getsize(name):>12,} bytes")
+
+    manager.close()
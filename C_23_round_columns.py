@@ -0,0 +1,440 @@
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress, repeat
+import json
+import mmap
+import operator
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from C_21_game_log import GameLogWriter, make_rounds, read_log
+from C_22_log_segments import LOG_FOLDER, compact_segment, segment_files
+
+COLUMN_FOLDER = "round_columns"
+
+# Columns (name | array type) - one file of fixed size values per column
+ROUND_COLUMNS = [
+    ["game", "I"],
+    ["round", "I"],
+    ["player", "I"],
+    ["color_1", "I"],
+    ["color_2", "I"],
+    ["color_3", "I"],
+    ["color_4", "I"],
+    ["choice", "b"],
+    ["chosen", "i"],
+    ["won", "B"],
+    ["target", "H"],
+    ["points", "H"],
+    ["highest", "H"],
+    ["reaction_ms", "I"]
+]
+
+# Things rounds can be grouped by (group name -> columns holding the group)
+GROUPS = {
+    "chosen": ["chosen"],
+    "offered": ["color_1", "color_2", "color_3", "color_4"],
+    "round": ["round"],
+    "choice": ["choice"],
+    "target": ["target"],
+    "player": ["player"]
+}
+
+# Rounds per chunk when the scan is split between processes
+CHUNK_ROUNDS = 2000000
+
+
+def read_details(column_folder):
+    """
+    :return: Column folder details (rounds | color names | players | last segment)
+    """
+    file = open(os.path.join(column_folder, "columns.json"), 'r')
+    details = json.load(file)
+    file.close()
+    return details
+
+
+def write_details(column_folder, details):
+    temporary_file = os.path.join(column_folder, "columns.json.tmp")
+    file = open(temporary_file, 'w')
+    json.dump(details, file)
+    file.close()
+    os.replace(temporary_file, os.path.join(column_folder, "columns.json"))
+
+
+def build_columns(log_folder=LOG_FOLDER, column_folder=COLUMN_FOLDER):
+    """
+    Adds rounds from log segments that haven't been added yet to the column
+    files (the newest segment is left until it's compacted, as it may still
+    be being written to)
+    :return: Number of rounds added
+    """
+    os.makedirs(column_folder, exist_ok=True)
+    try:
+        details = read_details(column_folder)
+    except (OSError, ValueError):
+        details = None
+
+    # Column files should hold at least the rounds in the details - if any
+    # are missing or short (or the columns have changed), start again
+    column_sizes = {}
+    for name, typecode in ROUND_COLUMNS:
+        column_file = os.path.join(column_folder, name + ".col")
+        column_sizes[column_file] = 0 if details is None else details["rounds"] * array(typecode).itemsize
+        if details is not None and (details.get("columns") != ROUND_COLUMNS or not os.path.exists(column_file)
+                                    or os.path.getsize(column_file) < column_sizes[column_file]):
+            details = None
+
+    if details is None:
+        details = {"rounds": 0, "color_names": [], "players": [], "last_segment": 0,
+                   "columns": ROUND_COLUMNS}
+        for column_file in column_sizes:
+            open(column_file, 'wb').close()
+    else:
+        # Rows past the rounds in the details were written by a build that was
+        # interrupted before it saved them (they are added again below)
+        for column_file, size in column_sizes.items():
+            os.truncate(column_file, size)
+
+    color_positions = {name: position for position, name in enumerate(details["color_names"])}
+    player_positions = {name: position for position, name in enumerate(details["players"])}
+
+    def position_of(name, positions, names):
+        if name not in positions:
+            positions[name] = len(names)
+            names.append(name)
+        return positions[name]
+
+    added = 0
+    for segment, segment_file in segment_files(log_folder):
+        if segment <= details["last_segment"] or not segment_file.endswith(".gz"):
+            continue
+
+        columns = {name: array(typecode) for name, typecode in ROUND_COLUMNS}
+        games = {}
+        for item in read_log(segment_file, games):
+            game, round_number, round_colors, choice, won, target, points, highest, time_ms, reaction_ms = item
+            colors = [position_of(name, color_positions, details["color_names"]) for name in round_colors]
+            player = games[game][0] if game in games else ""
+
+            columns["game"].append(game)
+            columns["round"].append(round_number)
+            columns["player"].append(position_of(player, player_positions, details["players"]))
+            for count in range(4):
+                columns[f"color_{count + 1}"].append(colors[count])
+            columns["choice"].append(-1 if choice is None else choice)
+            columns["chosen"].append(-1 if choice is None else colors[choice])
+            columns["won"].append(1 if won else 0)
+            columns["target"].append(target)
+            columns["points"].append(points)
+            columns["highest"].append(highest)
+            columns["reaction_ms"].append(reaction_ms or 0)
+
+        for name, values in columns.items():
+            file = open(os.path.join(column_folder, name + ".col"), 'ab')
+            values.tofile(file)
+            file.close()
+
+        added += len(columns["game"])
+        details["rounds"] += len(columns["game"])
+        details["last_segment"] = segment
+
+        # Saved after every segment, so an interrupted build carries on from
+        # the last segment it finished (anything written after that is cut off)
+        write_details(column_folder, details)
+
+    return added
+
+
+class ColumnFiles:
+    """
+    Memory maps of the column files, each cast to its array type so
+    values can be read (and sliced) without copying the file
+    """
+
+    def __init__(self, column_folder, rounds):
+        self.files = []
+        self.maps = []
+        self.columns = {}
+
+        for name, typecode in ROUND_COLUMNS:
+            file = open(os.path.join(column_folder, name + ".col"), 'rb')
+            self.files.append(file)
+            if rounds == 0:
+                self.columns[name] = memoryview(b"").cast(typecode)
+                continue
+
+            column_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps.append(column_map)
+
+            # Only the rounds listed in the details (a build may be adding more)
+            self.columns[name] = memoryview(column_map).cast(typecode)[:rounds]
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def close(self):
+        for column in self.columns.values():
+            column.release()
+        for column_map in self.maps:
+            column_map.close()
+        for file in self.files:
+            file.close()
+
+
+def scan_chunk(column_folder, rounds, group, filters, start, end):
+    """
+    Totals for each group over rounds start to end. The loops all run inside
+    Counter / zip / compress / map, so no Python code runs per round.
+    :param column_folder: Folder holding the column files
+    :param rounds: Rounds in the column files
+    :param group: Group name (see GROUPS)
+    :param filters: Dictionary of filters (player position, lowest and highest round)
+    :param start: First round of the chunk
+    :param end: Round after the last one in the chunk
+    :return: Dictionary of group -> [rounds | rounds won | points]
+    """
+    columns = ColumnFiles(column_folder, rounds)
+
+    # Rounds that pass the filters (None if there are no filters)
+    mask = None
+    if "player" in filters:
+        mask = bytes(map(filters["player"].__eq__, columns["player"][start:end]))
+    if "rounds" in filters:
+        round_mask = bytes(map(range(filters["rounds"][0], filters["rounds"][1] + 1).__contains__,
+                               columns["round"][start:end]))
+        mask = round_mask if mask is None else bytes(map(operator.and_, mask, round_mask))
+
+    def chunk_values(name):
+        values = columns[name][start:end]
+        if group == "target" and name == "target":
+            values = map(operator.floordiv, values, repeat(100))
+        if mask is not None:
+            values = compress(values, mask)
+        return values
+
+    # Counting each (group | won | points) combination takes one pass over the
+    # chunk, and there are far fewer combinations than rounds
+    totals = {}
+    for key_column in GROUPS[group]:
+        counts = Counter(zip(chunk_values(key_column), chunk_values("won"), chunk_values("points")))
+
+        for (key, won, points), count in counts.items():
+            key_totals = totals.setdefault(key, [0, 0, 0])
+            key_totals[0] += count
+            key_totals[1] += won * count
+            key_totals[2] += points * count
+
+    columns.close()
+    return totals
+
+
+def run_query(column_folder, group, filters, workers=1):
+    """
+    Splits the rounds into chunks, scans them (in parallel if there is more
+    than one worker) and adds the chunk totals together
+    :return: Dictionary of group -> [rounds | rounds won | points]
+    """
+    rounds = read_details(column_folder)["rounds"]
+    chunk_rounds = min(CHUNK_ROUNDS, -(-rounds // workers)) if rounds else 1
+    starts = list(range(0, rounds, chunk_rounds))
+    ends = [min(item + chunk_rounds, rounds) for item in starts]
+
+    arguments = [repeat(column_folder), repeat(rounds), repeat(group), repeat(filters), starts, ends]
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            chunk_totals = list(executor.map(scan_chunk, *arguments))
+    else:
+        chunk_totals = list(map(scan_chunk, *arguments))
+
+    totals = {}
+    for item in chunk_totals:
+        for key, values in item.items():
+            key_totals = totals.setdefault(key, [0, 0, 0])
+            for count in range(3):
+                key_totals[count] += values[count]
+
+    return totals
+
+
+def group_label(group, key, details):
+    """
+    :return: Readable name for a group key
+    """
+    if group in ["chosen", "offered"]:
+        return "(out of time)" if key < 0 else details["color_names"][key]
+    if group == "player":
+        return details["players"][key] or "(unknown)"
+    if group == "choice":
+        return "(out of time)" if key < 0 else f"Button {key + 1}"
+    if group == "target":
+        return f"{key * 100} - {key * 100 + 99}"
+    return str(key)
+
+
+def make_columns(column_folder, how_many, color_count=500):
+    """
+    Writes made up column files (for trying out queries on lots of rounds)
+    """
+    os.makedirs(column_folder, exist_ok=True)
+    details = {"rounds": how_many, "last_segment": 0,
+               "color_names": [f"color {item}" for item in range(color_count)],
+               "players": ["Ann", "Ben", "Cat"], "columns": ROUND_COLUMNS}
+
+    block = 1000000
+    files = {name: open(os.path.join(column_folder, name + ".col"), 'wb') for name, typecode in ROUND_COLUMNS}
+    for block_start in range(0, how_many, block):
+        size = min(block, how_many - block_start)
+        columns = {name: array(typecode) for name, typecode in ROUND_COLUMNS}
+        for position in range(block_start, block_start + size):
+            colors = random.sample(range(color_count), 4)
+            choice = random.randrange(4)
+            target = random.randint(100, 800)
+            score = random.randint(1, 999)
+            won = score >= target
+
+            # Colors later in the list are made to lose more often
+            if colors[choice] > color_count * 0.9 and random.random() < 0.5:
+                won = False
+
+            columns["game"].append(position // 20)
+            columns["round"].append(position % 20 + 1)
+            columns["player"].append(position // 20 % 3)
+            for count in range(4):
+                columns[f"color_{count + 1}"].append(colors[count])
+            columns["choice"].append(choice)
+            columns["chosen"].append(colors[choice])
+            columns["won"].append(1 if won else 0)
+            columns["target"].append(target)
+            columns["points"].append(score if won else 0)
+            columns["highest"].append(999)
+            columns["reaction_ms"].append(random.randint(300, 4000))
+
+        for name, values in columns.items():
+            values.tofile(files[name])
+
+    for file in files.values():
+        file.close()
+    write_details(column_folder, details)
+
+
+def check_resume(segments=3, segment_rounds=5000):
+    """
+    Checks that a build that was interrupted part way through a segment
+    (some columns written, details not saved) ends up the same as a build
+    that never stopped, once it is run again
+    :return: True if the column files match
+    """
+    work_folder = tempfile.mkdtemp()
+    log_folder = os.path.join(work_folder, "logs")
+    os.makedirs(log_folder)
+
+    def add_segment(segment):
+        segment_file = os.path.join(log_folder, f"segment_{segment:06d}.cqlog")
+        writer = GameLogWriter(segment_file)
+        for item in make_rounds(segment_rounds, 50):
+            writer.write_round(*item)
+        writer.close()
+        compact_segment(segment_file)
+
+    for segment in range(1, segments):
+        add_segment(segment)
+
+    # Interrupted build - the first segments are saved, then some columns of
+    # the next segment are written before the build stops
+    interrupted_folder = os.path.join(work_folder, "interrupted")
+    build_columns(log_folder, interrupted_folder)
+    for name, typecode in ROUND_COLUMNS[:len(ROUND_COLUMNS) // 2]:
+        file = open(os.path.join(interrupted_folder, name + ".col"), 'ab')
+        array(typecode, range(segment_rounds)).tofile(file)
+        file.close()
+
+    add_segment(segments)
+    build_columns(log_folder, interrupted_folder)
+
+    clean_folder = os.path.join(work_folder, "clean")
+    build_columns(log_folder, clean_folder)
+
+    matching = read_details(interrupted_folder) == read_details(clean_folder)
+    for name, typecode in ROUND_COLUMNS:
+        files = []
+        for folder in [interrupted_folder, clean_folder]:
+            file = open(os.path.join(folder, name + ".col"), 'rb')
+            files.append(file.read())
+            file.close()
+        matching = matching and files[0] == files[1]
+
+    shutil.rmtree(work_folder)
+    return matching
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Usage:
+    #   C_23_round_columns.py build [log folder] [column folder]
+    #   C_23_round_columns.py query <chosen | offered | round | choice | target | player>
+    #       [--player=NAME] [--rounds=FIRST-LAST] [--sort=rounds | won | lost | rate | points]
+    #       [--top=N] [--workers=N] [--folder=COLUMN FOLDER]
+    #   C_23_round_columns.py fake <rounds> [column folder]
+    #   C_23_round_columns.py check
+    arguments = [item for item in sys.argv[1:] if not item.startswith("--")]
+    options = dict(item[2:].split("=", 1) for item in sys.argv[1:] if item.startswith("--") and "=" in item)
+    command = arguments[0] if arguments else "query"
+
+    if command == "build":
+        start = time.perf_counter()
+        rounds_added = build_columns(arguments[1] if len(arguments) > 1 else LOG_FOLDER,
+                                     arguments[2] if len(arguments) > 2 else COLUMN_FOLDER)
+        print(f"Added {rounds_added:,} rounds in {time.perf_counter() - start:.1f} s")
+
+    elif command == "fake":
+        make_columns(arguments[2] if len(arguments) > 2 else COLUMN_FOLDER, int(arguments[1]))
+
+    elif command == "check":
+        if check_resume():
+            print("Interrupted build resumed correctly")
+        else:
+            sys.exit("Interrupted build does not match a clean build")
+
+    else:
+        folder = options.get("folder", COLUMN_FOLDER)
+        group_name = arguments[1] if len(arguments) > 1 else "chosen"
+        if group_name not in GROUPS:
+            sys.exit(f"Can't group by {group_name} (choose from {', '.join(GROUPS)})")
+
+        folder_details = read_details(folder)
+        query_filters = {}
+        if "player" in options:
+            if options["player"] not in folder_details["players"]:
+                sys.exit(f"No rounds for {options['player']}")
+            query_filters["player"] = folder_details["players"].index(options["player"])
+        if "rounds" in options:
+            first, last = options["rounds"].split("-")
+            query_filters["rounds"] = [int(first), int(last)]
+
+        start = time.perf_counter()
+        results = run_query(folder, group_name, query_filters, int(options.get("workers", os.cpu_count())))
+        elapsed = time.perf_counter() - start
+
+        # Rows (label | rounds | won | lost | win rate | average points | group key)
+        rows = [[group_label(group_name, key, folder_details), values[0], values[1],
+                 values[0] - values[1], values[1] / values[0], values[2] / values[0], key]
+                for key, values in results.items()]
+
+        # Groups that have an order are listed in that order unless a sort is asked for
+        sort_columns = {"rounds": 1, "won": 2, "lost": 3, "rate": 4, "points": 5}
+        if group_name in ["round", "choice", "target"] and "sort" not in options:
+            rows.sort(key=lambda item: item[6])
+        else:
+            rows.sort(key=lambda item: -item[sort_columns[options.get("sort", "lost")]])
+
+        print(f"{'':>20} {'Rounds':>10} {'Won':>10} {'Lost':>10} {'Win Rate':>9} {'Avg Points':>11}")
+        for row in rows[:int(options.get("top", 20))]:
+            print(f"{row[0]:>20} {row[1]:>10,} {row[2]:>10,} {row[3]:>10,} {row[4] * 100:>8.1f}% {row[5]:>11.1f}")
+        print(f"\n{folder_details['rounds']:,} rounds scanned in {elapsed:.2f} s")
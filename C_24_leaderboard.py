@@ -0,0 +1,189 @@
+import datetime
+import heapq
+import json
+import os
+import random
+import sys
+import time
+
+LEADERBOARD_FILE = "00_colour_leaderboard.json"
+
+# Games kept on each board
+TOP_GAMES = 10
+
+# Categories and time windows
+CATEGORIES = ["Total Score", "Success Rate", "Speed"]
+WINDOWS = ["Today", "This Week", "All Time"]
+
+# Shorter games can't get on the success rate or speed boards
+MIN_ROUNDS = 5
+
+
+def window_period(window, when=None):
+    """
+    :param window: Time window (see WINDOWS)
+    :param when: Date (default today)
+    :return: Which day / week / (all time) the date falls in
+    """
+    when = when or datetime.date.today()
+    if window == "Today":
+        return when.isoformat()
+    if window == "This Week":
+        year, week, day = when.isocalendar()
+        return f"{year}-W{week:02d}"
+    return "all"
+
+
+def game_keys(total_points, rounds_won, rounds_played, game_seconds, speed_run):
+    """
+    Works out how a game ranks in each category (bigger is better)
+    :return: Dictionary of category -> sort key (categories the game doesn't qualify for are left out)
+    """
+    keys = {"Total Score": [total_points]}
+    if rounds_played >= MIN_ROUNDS:
+        # Ties go to the game with more rounds
+        keys["Success Rate"] = [rounds_won / rounds_played, rounds_played]
+        if speed_run:
+            keys["Speed"] = [-game_seconds / rounds_played, rounds_played]
+    return keys
+
+
+class Leaderboard:
+    """
+    Best games in each category and time window. Each board is a min-heap
+    of at most TOP_GAMES games with the worst one on top, so a finished
+    game only has to beat the top of the heap (O(log k) to swap it in).
+    Daily and weekly boards start again when the day / week changes.
+    """
+
+    def __init__(self, leaderboard_file=LEADERBOARD_FILE, top_games=TOP_GAMES):
+        """
+        :param leaderboard_file: Name of the file the boards are saved in
+        :param top_games: Games kept on each board
+        """
+        self.leaderboard_file = leaderboard_file
+        self.top_games = top_games
+
+        # category -> window -> [period, heap of (sort key | order | game)]
+        self.boards = {category: {window: ["", []] for window in WINDOWS} for category in CATEGORIES}
+
+        # Games added so far (later games lose ties)
+        self.games_added = 0
+
+        self.load()
+
+    def load(self):
+        try:
+            file = open(self.leaderboard_file, 'r')
+            saved = json.load(file)
+            file.close()
+        except (OSError, ValueError):
+            return
+
+        self.games_added = saved.get("games_added", 0)
+        for category, windows in saved.get("boards", {}).items():
+            for window, board in windows.items():
+                if category in self.boards and window in self.boards[category]:
+                    # Saved as lists, and heaps compare entries as tuples
+                    heap = [(item[0], item[1], item[2]) for item in board[1]]
+                    heapq.heapify(heap)
+                    self.boards[category][window] = [board[0], heap]
+
+    def save(self):
+        temporary_file = self.leaderboard_file + ".tmp"
+        file = open(temporary_file, 'w')
+        json.dump({"games_added": self.games_added, "boards": self.boards}, file, separators=(",", ":"))
+        file.close()
+        os.replace(temporary_file, self.leaderboard_file)
+
+    def board(self, category, window):
+        """
+        :return: Heap for a category and window (emptied if its day / week is over)
+        """
+        board = self.boards[category][window]
+        period = window_period(window)
+        if board[0] != period:
+            board[0] = period
+            board[1] = []
+        return board[1]
+
+    def add_game(self, player, total_points, rounds_won, rounds_played, game_seconds,
+                 speed_run=False, save=True):
+        """
+        Puts a finished game on every board it makes it onto
+        :param speed_run: Whether the game was a speed run (only those go on the speed board)
+        :param save: Whether to save the boards afterwards
+        :return: List of (category | window) boards the game made it onto
+        """
+        self.games_added += 1
+        game = [player, total_points, rounds_won, rounds_played, round(game_seconds, 2),
+                datetime.date.today().isoformat()]
+
+        placed = []
+        for category, key in game_keys(total_points, rounds_won, rounds_played,
+                                       game_seconds, speed_run).items():
+            # Negative order so that of two equal games, the later one is on top of the heap
+            entry = (key, -self.games_added, game)
+
+            for window in WINDOWS:
+                heap = self.board(category, window)
+                if len(heap) < self.top_games:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+                else:
+                    continue
+                placed.append([category, window])
+
+        if save:
+            self.save()
+        return placed
+
+    def top(self, category, window):
+        """
+        :return: Games on a board, best first (player | points | won | rounds | seconds | date)
+        """
+        return [item[2] for item in sorted(self.board(category, window), reverse=True)]
+
+
+def entry_text(category, game):
+    """
+    :return: What's shown for a game on a board in the given category
+    """
+    player, total_points, rounds_won, rounds_played, game_seconds, date = game
+    if category == "Total Score":
+        value = f"{total_points} points"
+    elif category == "Success Rate":
+        value = f"{rounds_won / rounds_played * 100:.0f}% ({rounds_won} / {rounds_played})"
+    else:
+        value = f"{game_seconds / rounds_played:.2f} s per round ({rounds_played} rounds)"
+    return f"{player} - {value}"
+
+
+# Main routine
+if __name__ == "__main__":
+
+    # Adds made up games and shows how long updates take
+    # Usage: C_24_leaderboard.py [games] [leaderboard file]
+    games_wanted = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    test_file = sys.argv[2] if len(sys.argv) > 2 else "test_leaderboard.json"
+
+    leaderboard = Leaderboard(test_file)
+
+    start = time.perf_counter()
+    for count in range(games_wanted):
+        test_rounds = random.randint(1, 50)
+        test_won = random.randint(0, test_rounds)
+        leaderboard.add_game(random.choice(["Ann", "Ben", "Cat", "Dev"]), test_won * random.randint(300, 999),
+                             test_won, test_rounds, test_rounds * random.uniform(0.5, 5),
+                             random.random() < 0.3, save=False)
+    elapsed = time.perf_counter() - start
+    print(f"{games_wanted:,} games added in {elapsed:.2f} s ({elapsed / games_wanted * 1e6:.1f} us per game)")
+
+    leaderboard.save()
+    print(f"Saved in {os.path.getsize(test_file):,} bytes")
+
+    for category_name in CATEGORIES:
+        print(f"\n{category_name} (All Time)")
+        for position, test_game in enumerate(leaderboard.top(category_name, "All Time")):
+            print(f"{position + 1:>3}. {entry_text(category_name, test_game)}")